@@ -0,0 +1,432 @@
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+CARD_SCALE = 1/3
+PRELOAD_FOLDERS = ("Assets/UoN_Cards", "Assets/Tables", "Assets/UI")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+TABLE_BACKGROUNDS = tuple(f"Assets/Tables/Table_{i}.png" for i in range(5))
+_listings = {}
+
+
+def resolve(path):
+    """
+    Returns path, or the file in the same folder whose name matches it
+    ignoring case.
+
+    The card pngs are named inconsistently (Blue_0.png, BLUE_3.png, ...),
+    which only works on case-insensitive filesystems without this.
+    """
+    if os.path.exists(path):
+        return path
+    folder, name = os.path.split(path)
+    listing = _listings.get(folder)
+    if listing is None:
+        listing = _listings[folder] = {entry.lower(): entry for entry in os.listdir(folder or ".")}
+    return os.path.join(folder, listing.get(name.lower(), name))
+
+
+class ImageCache:
+    """
+    A class to represent the decoded, alpha-converted images of the game.
+
+    Images are keyed by their path ignoring case, so "Red_0.png" and the
+    "RED_0.png" on disk share one entry.
+
+    Attributes
+    ----------
+    surfaces: dict
+        Maps a normalised path to its converted surface.
+
+    Methods
+    -------
+    key:
+        Returns the normalised form of a path.
+    get:
+        Returns the surface for a path, loading it on first use.
+    put:
+        Stores an already converted surface for a path.
+    clear:
+        Drops every image.
+    """
+    def __init__(self):
+        self.surfaces = {}
+
+    def key(self, path):
+        return os.path.normpath(path).lower()
+
+    def get(self, path):
+        key = self.key(path)
+        image = self.surfaces.get(key)
+        if image is None:
+            image = pygame.image.load(resolve(path)).convert_alpha()
+            self.surfaces[key] = image
+        return image
+
+    def put(self, path, image):
+        self.surfaces[self.key(path)] = image
+
+    def clear(self):
+        self.surfaces.clear()
+
+    def __contains__(self, path):
+        return self.key(path) in self.surfaces
+
+    def __len__(self):
+        return len(self.surfaces)
+
+
+images = ImageCache()
+
+
+class Preloader:
+    """
+    A class to represent a background loader for the game's images.
+
+    The pngs are decoded by a thread pool while the start screen is showing.
+    Converting a surface to the display format has to happen on the main
+    thread, so poll() is called once per frame and hands finished images
+    over to the shared ImageCache within a small time budget.
+
+    Attributes
+    ----------
+    cache: ImageCache
+        Where the converted images are stored.
+    paths: list(str)
+        Every image file found in the preloaded folders.
+    pending: list
+        (path, future) pairs that have not been handed over yet.
+    total: int
+        The number of images being preloaded.
+    loaded: int
+        The number of images handed over (or failed).
+    failed: list(str)
+        The paths that could not be decoded.
+    workers: int
+        The size of the thread pool.
+
+    Methods
+    -------
+    start:
+        Submits every image that is not cached yet to the thread pool.
+    poll:
+        Converts decoded images on the main thread for up to a time budget.
+    finish:
+        Blocks until every image has been handed over.
+    """
+    def __init__(self, folders=PRELOAD_FOLDERS, cache=None, workers=4):
+        self.cache = cache if cache is not None else images
+        self.paths = []
+        for folder in folders:
+            for name in sorted(os.listdir(folder)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    self.paths.append(os.path.join(folder, name))
+        self.pending = []
+        self.total = 0
+        self.loaded = 0
+        self.failed = []
+        self.workers = workers
+        self.pool = None
+
+    @property
+    def progress(self):
+        return self.loaded/self.total if self.total else 1.0
+
+    @property
+    def done(self):
+        return not self.pending
+
+    def start(self):
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="preload")
+        self.pending = [(path, self.pool.submit(pygame.image.load, path)) for path in self.paths if path not in self.cache]
+        self.total = len(self.pending)
+        self.loaded = 0
+        if not self.pending:
+            self.pool.shutdown(wait=False)
+        return self
+
+    def poll(self, budget=0.004):
+        start = time.perf_counter()
+        pending = []
+        for path, future in self.pending:
+            if future.done() and time.perf_counter() - start < budget:
+                try:
+                    image = future.result()
+                except (pygame.error, OSError):
+                    self.failed.append(path)
+                else:
+                    if path not in self.cache:
+                        self.cache.put(path, image.convert_alpha())
+                self.loaded += 1
+            else:
+                pending.append((path, future))
+        self.pending = pending
+        if not self.pending and self.pool:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+        return self.progress
+
+    def finish(self):
+        for path, future in self.pending:
+            future.exception()
+        return self.poll(budget=float("inf"))
+
+
+class CardImageCache:
+    """
+    A class to represent a process-wide cache of card surfaces.
+
+    Every card face is decoded from disk once, then rotated and scaled once
+    per (angle, scale) pair. All Card objects showing the same face share a
+    reference to the same surface, so the cost of a frame no longer depends
+    on disk I/O.
+
+    Attributes
+    ----------
+    faces: ImageCache
+        The decoded, alpha-converted card pngs (shared with the preloader).
+    surfaces: dict
+        Maps (face, hidden, angle, scale) to the final rotated and scaled surface.
+    fans: dict
+        Maps (count, angle, spacing, scale) to a composite of that many face-down cards.
+    hits: int
+        The number of lookups answered from the cache.
+    misses: int
+        The number of lookups that had to build a new surface.
+
+    Methods
+    -------
+    get:
+        Returns the surface for a card face, building it on first use.
+    fan:
+        Returns a row of face-down cards as one surface, building it on first use.
+    load_face:
+        Returns the decoded surface for an image path, loading it on first use.
+    stats:
+        Returns the hit/miss counters and the number of cached surfaces.
+    clear:
+        Drops the rotated, scaled and composite surfaces and resets the counters.
+    """
+    def __init__(self, faces=None):
+        self.faces = faces if faces is not None else images
+        self.surfaces = {}
+        self.fans = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, face, hidden=False, angle=0, scale=CARD_SCALE):
+        if hidden:
+            face = "Assets/UoN_Cards/Deck.png"
+        key = (face, hidden, angle, scale)
+        image = self.surfaces.get(key)
+        if image is not None:
+            self.hits += 1
+            return image
+        self.misses += 1
+        image = self.load_face(face)
+        if angle != 0:
+            image = pygame.transform.rotate(image, angle)
+        image = pygame.transform.smoothscale(image, (image.get_width()*scale, image.get_height()*scale))
+        self.surfaces[key] = image
+        return image
+
+    def fan(self, count, angle=0, spacing=10, scale=CARD_SCALE):
+        """
+        Returns count face-down cards at angle, each spacing pixels right of
+        the previous one, composited onto a single surface.
+
+        A computer's hand is drawn with one blit of its fan instead of one
+        blit per card.
+        """
+        key = (count, angle, spacing, scale)
+        image = self.fans.get(key)
+        if image is not None:
+            self.hits += 1
+            return image
+        card = self.get("Assets/UoN_Cards/Deck.png", True, angle, scale)
+        self.misses += 1
+        width, height = card.get_size()
+        image = pygame.Surface((width + (count - 1)*spacing, height), pygame.SRCALPHA)
+        for i in range(count):
+            image.blit(card, (i*spacing, 0))
+        self.fans[key] = image
+        return image
+
+    def load_face(self, face):
+        return self.faces.get(face)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits/total if total else 0.0,
+            "surfaces": len(self.surfaces),
+            "fans": len(self.fans),
+            "faces": len(self.faces),
+        }
+
+    def clear(self):
+        # faces is the shared image cache; flushing it is left to its owner
+        self.surfaces.clear()
+        self.fans.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+card_images = CardImageCache()
+
+
+class BackgroundCache:
+    """
+    A class to represent the table backgrounds, scaled to the screen once.
+
+    Every scene fills the screen with one of the table images. Resampling a
+    full-screen image takes milliseconds, so each (image, size) pair is
+    scaled and converted to the display format once and shared by every
+    scene built afterwards; prepare scales them all up front so picking a
+    background is only a dictionary lookup.
+
+    Attributes
+    ----------
+    paths: list(str)
+        The table images, by index.
+    images: ImageCache
+        Where the decoded images come from.
+    surfaces: dict
+        Maps (index, size) to the scaled surface.
+    hits: int
+        The number of lookups answered from the cache.
+    misses: int
+        The number of lookups that had to scale an image.
+
+    Methods
+    -------
+    get:
+        Returns table image index scaled to a size (the screen's by default).
+    prepare:
+        Scales every table image to a size.
+    stats:
+        Returns the hit/miss counters and the number of cached surfaces.
+    clear:
+        Drops every scaled surface and resets the counters.
+    """
+    def __init__(self, paths=TABLE_BACKGROUNDS, cache=None):
+        self.paths = list(paths)
+        self.images = cache if cache is not None else images
+        self.surfaces = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, index=0, size=None):
+        if size is None:
+            size = pygame.display.get_surface().get_size()
+        key = (index, tuple(size))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = pygame.transform.smoothscale(self.images.get(self.paths[index]), key[1]).convert()
+        self.surfaces[key] = surface
+        return surface
+
+    def prepare(self, size=None):
+        for index in range(len(self.paths)):
+            self.get(index, size)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits/total if total else 0.0,
+            "surfaces": len(self.surfaces),
+        }
+
+    def clear(self):
+        self.surfaces.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.surfaces)
+
+
+backgrounds = BackgroundCache()
+
+
+class TextCache:
+    """
+    A class to represent a bounded, least-recently-used cache of rendered text.
+
+    Rasterising glyphs is one of the most expensive calls of a frame, and the
+    game renders the same few strings (names, button labels, the named
+    colour) over and over. Surfaces are keyed by (font, text, colour,
+    antialias, background) and shared, so callers must not draw on them.
+
+    Attributes
+    ----------
+    capacity: int
+        The most surfaces kept; the least recently used one is dropped beyond it.
+    surfaces: OrderedDict
+        Maps a key to its rendered surface, least recently used first.
+    hits: int
+        The number of lookups answered from the cache.
+    misses: int
+        The number of lookups that had to render.
+    evictions: int
+        The number of surfaces dropped to stay within capacity.
+
+    Methods
+    -------
+    render:
+        Returns the surface for a string, rendering it on first use.
+    stats:
+        Returns the hit/miss counters and the number of cached surfaces.
+    clear:
+        Drops every cached surface and resets the counters.
+    """
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, font, text, antialias=True, color="black", background=None):
+        key = (font, text, color, bool(antialias), background)
+        image = self.surfaces.get(key)
+        if image is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return image
+        self.misses += 1
+        image = font.render(text, antialias, color, background)
+        self.surfaces[key] = image
+        if len(self.surfaces) > self.capacity:
+            self.surfaces.popitem(last=False)
+            self.evictions += 1
+        return image
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits/total if total else 0.0,
+            "surfaces": len(self.surfaces),
+            "evictions": self.evictions,
+        }
+
+    def clear(self):
+        self.surfaces.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+text_cache = TextCache()
@@ -0,0 +1,296 @@
+"""
+NumPy lockstep engine for bulk game statistics.
+
+Plays many games between random computer players at once. Each call to
+BatchEngine.step plays one turn of every running game with masked array
+operations, so the Python overhead is paid per turn rather than per game:
+
+    python batch.py --games 100000 --players 4
+
+State is kept as arrays over the games (G), seats (P) and the 54 card faces
+(F) of cards.py:
+
+    hands       G x P x F   number of copies of each face in each hand
+    deck        G x 108*D   the draw pile of D decks as shuffled faces, drawn from pos
+    discard     G x F       the discard pile below the top card, as counts
+    top         G           the face on top of the discard pile
+
+Only the top of the discard pile is ever looked at and the rest is shuffled
+back into the deck as a whole, so counts describe it exactly.
+
+Every seat plays like engine.RandomBot and every turn follows the rules of
+engine.Engine: dispose of a random card, pick one, play a random matching
+card (drawing one more first if nothing matches) and name a random colour
+after a wild. Skip and Reverse (a Skip with two players), Draw (+2) and
+Wild_Draw (+4) penalties and reshuffling the discard pile when the deck runs
+out all behave as in the engine, so the statistics match simulate.py and the
+interactive game. RandomBot always shouts UNO in time, so the missed-shout
+penalty never comes up and is not modelled.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from cards import COLORED_RANKS, DECK_SIZE, FACE, FACES, NO_COLOR, PLAYABLE, RANK, SCORE, colors, decks_needed, ids, ranks
+from engine import MAX_SEATS
+from simulate import SimulationStats
+
+SKIP = ranks.index("Skip")
+REVERSE = ranks.index("Reverse")
+DRAW_TWO = ranks.index("Draw")
+WILD_DRAW = ranks.index("Wild_Draw")
+
+
+def face_table(values):
+    """Returns a per-face array of a per-card table."""
+    table = np.zeros(FACES, dtype=np.int64)
+    for card, value in enumerate(values):
+        table[FACE[card]] = value
+    return table
+
+
+FACE_RANK = face_table(RANK)
+FACE_SCORE = face_table(SCORE)
+DECK = np.array(FACE, dtype=np.int8)
+
+# VALID[FACE[top]*(NO_COLOR+1) + named colour] is the PLAYABLE mask as one bool per face
+VALID = np.zeros((len(PLAYABLE), FACES), dtype=bool)
+for index, mask in enumerate(PLAYABLE):
+    for card in ids(mask):
+        VALID[index, FACE[card]] = True
+
+
+class BatchEngine:
+    """
+    A class to represent many games of UNO played in lockstep.
+
+    Attributes
+    ----------
+    games: int
+        The number of games in the batch.
+    players: int
+        The number of seats in every game.
+    decks: int
+        The number of decks shuffled together, by default the fewest that deal every hand.
+    rng: numpy.random.Generator
+        The source of randomness for shuffles and moves.
+    hands: numpy.ndarray
+        G x P x F copies of each face in each hand.
+    deck: numpy.ndarray
+        G x 108*decks faces of the draw pile; pos to size are still in the pile.
+    pos: numpy.ndarray
+        The next deck slot to draw, per game.
+    size: numpy.ndarray
+        The number of slots of deck in use, per game.
+    discard: numpy.ndarray
+        G x F copies of each face under the top of the discard pile.
+    top: numpy.ndarray
+        The face on top of the discard pile, per game.
+    color: numpy.ndarray
+        The colour named by the last wild card, or NO_COLOR, per game.
+    direction: numpy.ndarray
+        The direction of play (1 or -1), per game.
+    turn: numpy.ndarray
+        The seat whose turn it is, per game.
+    to_pick: numpy.ndarray
+        G x P cards each seat still has to pick up.
+    winner: numpy.ndarray
+        The winning seat, or -1 while the game is running.
+    turns: numpy.ndarray
+        The number of times the turn passed to another seat, per game.
+    reshuffles: numpy.ndarray
+        The number of times the discard pile was shuffled into the deck, per game.
+
+    Methods
+    -------
+    draw:
+        Moves the top card of the deck into one hand of each given game.
+    reshuffle:
+        Shuffles the discard pile of the given games back into their decks.
+    pick:
+        Returns a random face from each row of counts, weighted by the counts.
+    advance:
+        Passes the turn in the given games, or ends them when the current hand is empty.
+    step:
+        Plays one turn of every running game.
+    run:
+        Steps until every game has finished.
+    stats:
+        Returns the results as a SimulationStats.
+    """
+    def __init__(self, games, players, hand_size=7, seed=None):
+        if not 2 <= players <= MAX_SEATS:
+            raise ValueError(f"a game needs 2 to {MAX_SEATS} players, not {players}")
+        self.games = games
+        self.players = players
+        self.decks = decks_needed(players, hand_size)
+        self.rng = np.random.default_rng(seed)
+        everyone = np.arange(games)
+        cards = self.decks*DECK_SIZE
+        self.deck = DECK[:cards][np.argsort(self.rng.random((games, cards)), axis=1)]
+        self.pos = np.zeros(games, dtype=np.int64)
+        self.size = np.full(games, cards, dtype=np.int64)
+        self.hands = np.zeros((games, players, FACES), dtype=np.int16)
+        self.discard = np.zeros((games, FACES), dtype=np.int16)
+        for seat in range(players):
+            for i in range(hand_size):
+                self.hands[everyone, seat, self.deck[everyone, self.pos]] += 1
+                self.pos += 1
+        self.top = self.deck[everyone, self.pos].astype(np.int64)
+        self.pos += 1
+        self.color = np.full(games, NO_COLOR, dtype=np.int64)
+        self.direction = np.full(games, -1, dtype=np.int64)
+        self.turn = np.zeros(games, dtype=np.int64)
+        self.to_pick = np.zeros((games, players), dtype=np.int64)
+        self.winner = np.full(games, -1, dtype=np.int64)
+        self.turns = np.zeros(games, dtype=np.int64)
+        self.reshuffles = np.zeros(games, dtype=np.int64)
+
+    def draw(self, g, p):
+        """Draws one card for seat p[i] of game g[i]; each game may appear once."""
+        has = self.pos[g] < self.size[g]
+        g, p = g[has], p[has]
+        self.hands[g, p, self.deck[g, self.pos[g]]] += 1
+        self.pos[g] += 1
+        empty = g[self.pos[g] == self.size[g]]
+        if len(empty):
+            self.reshuffle(empty)
+
+    def reshuffle(self, g):
+        counts = self.discard[g]
+        total = counts.sum(axis=1)
+        slots = np.arange(self.deck.shape[1])
+        faces = (np.cumsum(counts, axis=1)[:, :, None] <= slots).sum(axis=1)
+        keys = self.rng.random(faces.shape)
+        keys[slots >= total[:, None]] = 2.0
+        self.deck[g] = np.take_along_axis(faces, np.argsort(keys, axis=1), axis=1)
+        self.pos[g] = 0
+        self.size[g] = total
+        self.discard[g] = 0
+        self.reshuffles[g] += 1
+
+    def pick(self, counts):
+        cumulative = np.cumsum(counts, axis=1)
+        r = (self.rng.random(len(counts))*cumulative[:, -1]).astype(np.int64)
+        return (cumulative <= r[:, None]).sum(axis=1)
+
+    def advance(self, g):
+        p = self.turn[g]
+        empty = self.hands[g, p].sum(axis=1) == 0
+        self.winner[g[empty]] = p[empty]
+        g = g[~empty]
+        self.turn[g] = (self.turn[g] + self.direction[g]) % self.players
+        self.turns[g] += 1
+
+    def step(self):
+        """Plays one turn of every running game and returns how many are still running."""
+        g = np.flatnonzero(self.winner < 0)
+        p = self.turn[g]
+
+        # penalty: the whole turn is spent picking up the pending cards
+        penalty = self.to_pick[g, p] > 0
+        pg, pp = g[penalty], p[penalty]
+        while len(pg):
+            self.draw(pg, pp)
+            self.to_pick[pg, pp] -= 1
+            done = self.to_pick[pg, pp] == 0
+            self.advance(pg[done])
+            pg, pp = pg[~done], pp[~done]
+        g, p = g[~penalty], p[~penalty]
+
+        # dispose of a random card to the bottom of the discard pile
+        holding = self.hands[g, p].sum(axis=1) > 0
+        hg, hp = g[holding], p[holding]
+        card = self.pick(self.hands[hg, hp])
+        self.hands[hg, hp, card] -= 1
+        self.discard[hg, card] += 1
+
+        # pick a card, and one more if nothing matches the discard pile
+        self.draw(g, p)
+        playable = self.hands[g, p]*VALID[self.top[g]*(NO_COLOR+1) + self.color[g]]
+        stuck = playable.sum(axis=1) == 0
+        self.draw(g[stuck], p[stuck])
+        playable[stuck] = self.hands[g[stuck], p[stuck]]*VALID[self.top[g[stuck]]*(NO_COLOR+1) + self.color[g[stuck]]]
+        playing = playable.sum(axis=1) > 0
+        self.advance(g[~playing])
+        g, p, playable = g[playing], p[playing], playable[playing]
+
+        # play a random matching card
+        card = self.pick(playable)
+        self.hands[g, p, card] -= 1
+        self.discard[g, self.top[g]] += 1
+        self.top[g] = card
+        rank = FACE_RANK[card]
+        wild = rank >= COLORED_RANKS
+        self.color[g] = NO_COLOR
+        self.color[g[wild]] = self.rng.integers(len(colors), size=wild.sum())
+        reverse = rank == REVERSE
+        self.direction[g[reverse]] *= -1
+        following = (p + self.direction[g]) % self.players
+        self.to_pick[g[rank == DRAW_TWO], following[rank == DRAW_TWO]] = 2
+        self.to_pick[g[rank == WILD_DRAW], following[rank == WILD_DRAW]] = 4
+        skip = (rank == SKIP) | (reverse & (self.players == 2))
+        self.advance(g[skip])
+        self.advance(g)
+        return int((self.winner < 0).sum())
+
+    def run(self, max_turns=100000):
+        for i in range(max_turns):
+            if not self.step():
+                break
+        return self
+
+    def stats(self):
+        stats = SimulationStats(self.players)
+        finished = self.winner >= 0
+        stats.games = int(finished.sum())
+        stats.unfinished = self.games - stats.games
+        stats.wins = np.bincount(self.winner[finished], minlength=self.players).tolist()
+        stats.turns = int(self.turns[finished].sum())
+        stats.reshuffles = int(self.reshuffles[finished].sum())
+        stats.score = int((self.hands[finished]*FACE_SCORE).sum())
+        return stats
+
+
+def simulate(games, players, chunk=20000, seed=None):
+    """Plays games games in batches of chunk and returns the merged SimulationStats."""
+    total = SimulationStats(players)
+    seeds = np.random.SeedSequence(seed).spawn((games + chunk - 1)//chunk)
+    start = time.perf_counter()
+    for i, child in enumerate(seeds):
+        size = min(chunk, games - i*chunk)
+        total.merge(BatchEngine(size, players, seed=child).run().stats())
+    total.elapsed = time.perf_counter() - start
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many UNO games in lockstep with NumPy and report their statistics.")
+    parser.add_argument("--games", type=int, default=100000, help="number of games to play")
+    parser.add_argument("--players", type=int, default=4, help="seats per game (2-20)")
+    parser.add_argument("--chunk", type=int, default=20000, help="games stepped together")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible runs")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = simulate(args.games, args.players, args.chunk, args.seed).report()
+    del report["steps_per_sec"], report["mean_steps"]
+    if args.json:
+        print(json.dumps(report))
+        return
+    print(f"{report['games']} games with {report['players']} players in {report['elapsed']}s")
+    print(f"  games/sec:        {report['games_per_sec']}")
+    print(f"  turns/sec:        {report['turns_per_sec']}")
+    print(f"  mean game length: {report['mean_turns']} turns")
+    print(f"  reshuffles:       {report['reshuffles']} ({report['mean_reshuffles']} per game)")
+    print(f"  mean score:       {report['mean_score']}")
+    for seat, rate in enumerate(report["win_rate"]):
+        print(f"  seat {seat} win rate: {rate:.2%}")
+    if report["unfinished"]:
+        print(f"  unfinished games: {report['unfinished']}")
+
+
+if __name__ == "__main__":
+    main()
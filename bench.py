@@ -0,0 +1,281 @@
+"""
+Benchmark suite for the rendering and game-logic hot paths.
+
+Runs on SDL's dummy video and audio drivers, so it needs no display or sound
+card:
+
+    python bench.py                              # run and print a summary
+    python bench.py --output results.json        # also save the results
+    python bench.py --baseline baseline.json     # compare against a stored run
+
+Every benchmark re-seeds the random module before it starts, so each run
+times the same deals and the same games. Results are JSON. With --baseline
+the median of each benchmark is compared with the stored median and the
+script exits with status 1 if any of them is slower by more than
+--threshold (default 25%).
+"""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+import pygame
+
+import main
+import engine
+from assets import card_images, images
+from main import Table, Card, CARDS
+
+BENCHMARKS = {}
+
+
+def benchmark(name, number=1, repeat=15):
+    """Registers a benchmark. The function returns a callable to time, after doing its setup."""
+    def decorator(function):
+        BENCHMARKS[name] = (function, number, repeat)
+        return function
+    return decorator
+
+
+def autoplay(table):
+    """Lets a RandomBot play the human seat of a Table."""
+    human = table.players[0]
+    bot = engine.RandomBot()
+
+    def update(events, dt):
+        action = bot.choose(table.engine)
+        if action.kind == engine.SHOUT:
+            human.shout_uno()
+            return
+        return table.apply(action)
+    human.update = update
+
+
+@benchmark("card_load_image_cold", repeat=5)
+def bench_load_cold():
+    def run():
+        images.clear()
+        card_images.clear()
+        for color, number, special in CARDS:
+            Card((0, 0), color=color, number=number, special=special)
+    return run
+
+
+@benchmark("card_load_image_warm", number=20)
+def bench_load_warm():
+    cards = [Card((0, 0), color=color, number=number, special=special) for color, number, special in CARDS]
+
+    def run():
+        for card in cards:
+            card.load_image()
+    return run
+
+
+def bench_table_draw(players):
+    def setup():
+        table = Table(players)
+        surface = pygame.Surface(main.screen.get_size())
+        return lambda: table.draw(surface)
+    return setup
+
+
+def bench_table_draw_dirty(players):
+    def setup():
+        table = Table(players)
+        table.draw(main.renderer)
+        main.renderer.present()
+
+        def run():
+            table.draw(main.renderer)
+            main.renderer.present()
+        return run
+    return setup
+
+
+for players in (2, 4, 8):
+    benchmark(f"table_draw_{players}p", number=10)(bench_table_draw(players))
+    benchmark(f"table_draw_dirty_{players}p", number=10)(bench_table_draw_dirty(players))
+
+
+def bench_record_capture(whole):
+    """Times the game-thread side of recording a frame: a whole frame, or one card-sized region."""
+    def setup():
+        from recorder import Recorder  # needs NumPy
+        table = Table(4)
+        table.draw(main.renderer)
+        main.renderer.present()
+        recorder = Recorder(os.devnull, main.screen.get_size(), queue_size=10000).start()
+        dirty = [pygame.Rect(100, 100, 120, 180)]
+
+        def run():
+            if whole:
+                recorder.gap()
+            recorder.capture(main.screen, dirty)
+        return run
+    return setup
+
+
+benchmark("record_capture_card", number=20)(bench_record_capture(False))
+benchmark("record_capture_whole", number=5)(bench_record_capture(True))
+
+
+@benchmark("get_valid_cards_40", number=200)
+def bench_valid_cards():
+    table = Table(4)
+    human = table.players[0]
+    while len(human.rules.cards) < 40:
+        human.rules.cards.add(table.engine.deck.popleft())
+    return human.getValidCards
+
+
+@benchmark("engine_valid_cards_40", number=200)
+def bench_engine_valid_cards():
+    game = engine.Engine(["a", "b", "c", "d"])
+    player = game.players[0]
+    while len(player.cards) < 40:
+        player.cards.add(game.deck.popleft())
+    return lambda: game.valid_cards(player)
+
+
+@benchmark("table_init_4p", repeat=10)
+def bench_table_init():
+    Table(4)
+    return lambda: Table(4)
+
+
+@benchmark("scene_change", number=5)
+def bench_scene_change():
+    return lambda: (main.Select_Screen(), main.Win_Screen("You", 120))
+
+
+def bench_engine_turns(players, steps=200):
+    """Times steps actions at a table of players seats; the cost per action should not depend on players."""
+    def setup():
+        game = engine.Engine([f"Bot{i+1}" for i in range(players)], seed=1, decks=4)
+        start = game.snapshot()
+        bot = engine.RandomBot(random.Random(1))
+
+        def run():
+            game.restore(start)
+            for i in range(steps):
+                if game.winner is not None:
+                    game.restore(start)
+                game.step(bot.choose(game))
+        return run
+    return setup
+
+
+for players in (4, 8, 12, 16, 20):
+    benchmark(f"engine_turns_{players}p", number=5)(bench_engine_turns(players))
+
+
+@benchmark("engine_game_4p", number=20)
+def bench_engine_game():
+    return lambda: engine.play_game(["a", "b", "c", "d"])
+
+
+@benchmark("table_game_4p", repeat=5)
+def bench_table_game():
+    def run():
+        table = Table(4)
+        autoplay(table)
+        for frame in range(100000):
+            table.draw(main.renderer)
+            main.renderer.present()
+            if table.update([], 1.0):
+                break
+    return run
+
+
+def run_benchmark(name):
+    function, number, repeat = BENCHMARKS[name]
+    random.seed(1234)
+    run = function()
+    run()
+    times = []
+    for i in range(repeat):
+        random.seed(1234 + i)
+        start = time.perf_counter()
+        for j in range(number):
+            run()
+        times.append((time.perf_counter() - start)/number)
+    return {
+        "median_s": statistics.median(times),
+        "min_s": min(times),
+        "mean_s": statistics.fmean(times),
+        "stdev_s": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def run_all(selected=None):
+    results = {}
+    for name in BENCHMARKS:
+        if selected and not any(pattern in name for pattern in selected):
+            continue
+        results[name] = run_benchmark(name)
+        print(f"{name:<26}{results[name]['median_s']*1000:>10.3f} ms", file=sys.stderr)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "screen": list(main.screen.get_size()),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Prints the change of every benchmark and returns the names that regressed."""
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<26}{'new':>10}")
+            continue
+        limit = baseline.get("thresholds", {}).get(name, threshold)
+        ratio = result["median_s"]/base["median_s"] if base["median_s"] else 1.0
+        flag = ""
+        if ratio > 1 + limit:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<26}{base['median_s']*1000:>10.3f} ->{result['median_s']*1000:>10.3f} ms  {ratio-1:>+7.1%}{flag}")
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark the UNO rendering and game-logic hot paths.")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown before a benchmark counts as a regression (0.25 = 25%%)")
+    parser.add_argument("--only", nargs="*", help="only run benchmarks whose name contains one of these")
+    args = parser.parse_args()
+
+    results = run_all(args.only)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
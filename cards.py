@@ -0,0 +1,362 @@
+"""
+Compact integer encoding of the UNO deck.
+
+Every card of one deck is an id 0..107; a game with several decks numbers the
+copies on, so card id is copy id//DECK_SIZE of CARDS[id % DECK_SIZE]. The
+tables below are indexed by id for up to MAX_DECKS decks and are built once
+at import time, so looking up a card's colour, rank or score is a list index
+instead of a string comparison:
+
+    COLOR[id]   index into colors, or WILD for wild cards
+    RANK[id]    0..9 for number cards, then Skip, Reverse, Draw, Wild_Draw, Wild
+    FACE[id]    0..53, one value per distinct face (the deck holds duplicates)
+    SCORE[id]   the points the card is worth at the end of a game
+
+A hand is a Hand bitset with bit id set for every card held. For each top of
+the discard pile and named colour PLAYABLE holds the mask of every card that
+may be played on it (in every deck), so the legal moves of a hand are a
+single AND.
+
+The draw and discard piles are Pile ring buffers.
+"""
+import random
+
+colors = ["Red", "Blue", "Green", "Yellow"]
+specialCards = ["Skip", "Reverse", "Draw"]
+wildCards = ["Wild_Draw", "Wild"]
+ranks = [str(number) for number in range(10)] + specialCards + wildCards
+
+WILD = len(colors)
+NO_COLOR = len(colors)
+
+
+def build_cards():
+    """Returns the (color, number, special) triple of every card, in deck order."""
+    cards = []
+    for color in colors:
+        cards.append((color, "0", ""))
+        for i in range(2):
+            for number in range(1, 10):
+                cards.append((color, number, ""))
+            for special in specialCards:
+                cards.append((color, "", special))
+    for i in range(4):
+        for wild in wildCards:
+            cards.append(("", "", wild))
+    return cards
+
+
+CARDS = build_cards()
+DECK_SIZE = len(CARDS)
+MAX_DECKS = 4
+COLOR = [colors.index(color) if color else WILD for color, number, special in CARDS]*MAX_DECKS
+RANK = [ranks.index(str(number) if number != "" else special) for color, number, special in CARDS]*MAX_DECKS
+COLORED_RANKS = len(ranks) - len(wildCards)
+FACE = [color*COLORED_RANKS + rank if color != WILD else WILD*COLORED_RANKS + rank - COLORED_RANKS
+        for color, rank in zip(COLOR, RANK)]
+FACES = max(FACE) + 1
+SCORE = [int(number) if number != "" else 20 if special in specialCards else 50 for color, number, special in CARDS]*MAX_DECKS
+IS_WILD = [color == WILD for color in COLOR]
+
+
+def decks_needed(players, hand_size=7):
+    """Returns the fewest decks that deal players hands of hand_size and leave a deck and a discard pile."""
+    return -(-(players*hand_size + 2)//DECK_SIZE)
+
+
+def card_of(card):
+    """Returns the (color, number, special) triple of a card id, in any deck."""
+    return CARDS[card % DECK_SIZE]
+
+
+COLOR_INDEX = {color: i for i, color in enumerate(colors)}
+COLOR_INDEX[""] = NO_COLOR
+
+
+def color_index(color_state):
+    """Returns the index of a colour name, or NO_COLOR for ""."""
+    return COLOR_INDEX[color_state]
+
+
+def build_playable():
+    """
+    Returns PLAYABLE, indexed by FACE[top]*(NO_COLOR+1) + named colour.
+
+    A card can be played on top when it has the same colour, the same rank or
+    is wild. A wild top card takes the colour that was named for it.
+    """
+    by_color = [0]*(NO_COLOR+1)
+    by_rank = [0]*len(ranks)
+    wild = 0
+    for card in range(len(COLOR)):
+        if IS_WILD[card]:
+            wild |= 1 << card
+        else:
+            by_color[COLOR[card]] |= 1 << card
+        by_rank[RANK[card]] |= 1 << card
+    playable = [0]*(FACES*(NO_COLOR+1))
+    for top in range(DECK_SIZE):
+        for named in range(NO_COLOR+1):
+            color = named if IS_WILD[top] else COLOR[top]
+            mask = by_rank[RANK[top]] | wild
+            if color != NO_COLOR:
+                mask |= by_color[color]
+            playable[FACE[top]*(NO_COLOR+1) + named] = mask
+    return playable
+
+
+PLAYABLE = build_playable()
+
+
+def playable_mask(top, color_state=""):
+    return PLAYABLE[FACE[top]*(NO_COLOR+1) + color_index(color_state)]
+
+
+def can_play_on(card, top, color_state=""):
+    """Returns whether card can be played on top (a wild top takes color_state)."""
+    return playable_mask(top, color_state) >> card & 1 == 1
+
+
+def card_score(card):
+    return SCORE[card]
+
+
+def ids(mask):
+    """Yields the card ids set in mask, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class Hand:
+    """
+    A class to represent a hand of cards as a bitset of card ids.
+
+    Iterating a Hand yields its card ids in ascending order.
+
+    Attributes
+    ----------
+    mask: int
+        Bit id is set for every card id in the hand.
+    count: int
+        The number of cards in the hand.
+    points: int
+        The score of the cards in the hand, kept up to date by add and remove.
+
+    Methods
+    -------
+    add:
+        Adds a card id to the hand.
+    remove:
+        Removes a card id from the hand.
+    clear:
+        Empties the hand.
+    playable:
+        Returns the ids in the hand that are also set in a PLAYABLE mask.
+    score:
+        Returns the points of the cards in the hand, in O(1).
+    copy:
+        Returns an independent copy of the hand.
+    """
+    __slots__ = ("mask", "count", "points")
+
+    def __init__(self, cards=()):
+        self.mask = 0
+        self.count = 0
+        self.points = 0
+        for card in cards:
+            self.add(card)
+
+    def add(self, card):
+        self.mask |= 1 << card
+        self.count += 1
+        self.points += SCORE[card]
+
+    def remove(self, card):
+        if not self.mask >> card & 1:
+            raise ValueError(f"card {card} is not in the hand")
+        self.mask ^= 1 << card
+        self.count -= 1
+        self.points -= SCORE[card]
+
+    def clear(self):
+        self.mask = 0
+        self.count = 0
+        self.points = 0
+
+    def playable(self, mask):
+        mask &= self.mask
+        playable = []
+        while mask:
+            low = mask & -mask
+            playable.append(low.bit_length() - 1)
+            mask ^= low
+        return playable
+
+    def score(self):
+        return self.points
+
+    def copy(self):
+        hand = Hand.__new__(Hand)
+        hand.mask = self.mask
+        hand.count = self.count
+        hand.points = self.points
+        return hand
+
+    def __contains__(self, card):
+        return card is not None and self.mask >> card & 1 == 1
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return ids(self.mask)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("hand index out of range")
+        mask = self.mask
+        for i in range(index):
+            mask &= mask - 1
+        return (mask & -mask).bit_length() - 1
+
+    def __eq__(self, other):
+        if isinstance(other, Hand):
+            return self.mask == other.mask
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return f"Hand({list(self)})"
+
+
+class Pile:
+    """
+    A class to represent a pile of cards as a fixed-size ring buffer.
+
+    Drawing from the front, adding to either end and peeking at either end
+    are all O(1). Index 0 is the front of the pile and index -1 the back.
+
+    Attributes
+    ----------
+    buffer: list(int)
+        The ring buffer; only size slots starting at head hold cards.
+    head: int
+        The buffer slot of the front card.
+    size: int
+        The number of cards in the pile.
+
+    Methods
+    -------
+    append:
+        Puts a card at the back of the pile.
+    appendleft:
+        Puts a card at the front of the pile.
+    pop:
+        Removes and returns the card at the back of the pile.
+    popleft:
+        Removes and returns the card at the front of the pile.
+    shuffle:
+        Shuffles the pile in place.
+    reshuffle_from:
+        Takes every card but the back one from another pile and shuffles them, without copying.
+    copy:
+        Returns an independent copy of the pile.
+    load:
+        Replaces the contents of the pile with a sequence of cards, in place.
+    """
+    __slots__ = ("buffer", "head", "size")
+
+    def __init__(self, cards=(), capacity=DECK_SIZE):
+        self.buffer = [0]*capacity
+        self.head = 0
+        self.size = 0
+        for card in cards:
+            self.append(card)
+
+    def append(self, card):
+        if self.size == len(self.buffer):
+            raise IndexError("pile is full")
+        self.buffer[(self.head + self.size) % len(self.buffer)] = card
+        self.size += 1
+
+    def appendleft(self, card):
+        if self.size == len(self.buffer):
+            raise IndexError("pile is full")
+        self.head = (self.head - 1) % len(self.buffer)
+        self.buffer[self.head] = card
+        self.size += 1
+
+    def pop(self):
+        if not self.size:
+            raise IndexError("pop from an empty pile")
+        self.size -= 1
+        return self.buffer[(self.head + self.size) % len(self.buffer)]
+
+    def popleft(self):
+        if not self.size:
+            raise IndexError("pop from an empty pile")
+        card = self.buffer[self.head]
+        self.head = (self.head + 1) % len(self.buffer)
+        self.size -= 1
+        return card
+
+    def shuffle(self, rng=random):
+        buffer, head, capacity = self.buffer, self.head, len(self.buffer)
+        for i in range(self.size - 1, 0, -1):
+            j = rng.randrange(i + 1)
+            a = (head + i) % capacity
+            b = (head + j) % capacity
+            buffer[a], buffer[b] = buffer[b], buffer[a]
+
+    def reshuffle_from(self, other, rng=random):
+        """
+        Moves every card of other except its back (top) card into this empty
+        pile and shuffles them.
+
+        The two piles swap ring buffers, so no card list is copied; other is
+        left holding only its top card.
+        """
+        if self.size:
+            raise ValueError("can only reshuffle into an empty pile")
+        top = other.pop()
+        self.buffer, other.buffer = other.buffer, self.buffer
+        self.head, other.head = other.head, 0
+        self.size, other.size = other.size, 0
+        other.append(top)
+        self.shuffle(rng)
+
+    def copy(self):
+        pile = Pile.__new__(Pile)
+        pile.buffer = self.buffer[:]
+        pile.head = self.head
+        pile.size = self.size
+        return pile
+
+    def load(self, cards):
+        size = len(cards)
+        if size > len(self.buffer):
+            raise IndexError("pile is full")
+        self.buffer[:size] = cards
+        self.head = 0
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("pile index out of range")
+        return self.buffer[(self.head + index) % len(self.buffer)]
+
+    def __iter__(self):
+        buffer, head, capacity = self.buffer, self.head, len(self.buffer)
+        for i in range(self.size):
+            yield buffer[(head + i) % capacity]
+
+    def __repr__(self):
+        return f"Pile({list(self)})"
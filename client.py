@@ -0,0 +1,146 @@
+"""
+Blocking client for server.py, used by the pygame game.
+
+A reader thread turns the server's JSON lines into messages on a queue, so
+the render loop only ever polls. The game keeps its own Engine, created from
+the seed in the start message: the local player's actions are applied
+straight away and sent to the server, and the other seats are played by
+RemoteBots that hand back the actions the server broadcast for them, in
+order. When the connection is lost, or next_action finds the server out
+of step with the game, main.Table hands those seats to local computer
+players and the game goes on offline.
+
+Set UNO_SERVER=host:port to make the game play through a server.
+"""
+import json
+import queue
+import socket
+import threading
+
+from replay import decode, encode
+
+
+class RemoteClient:
+    """
+    A class to represent a connection to the game server.
+
+    Attributes
+    ----------
+    socket: socket.socket
+        The TCP connection.
+    inbox: queue.Queue
+        Messages from the server, filled by the reader thread; None once it disconnected.
+    start: dict
+        The start message of the game, once joined.
+    seat: int
+        The local player's seat.
+    pending: dict
+        An action message that was taken from the inbox but not handed out yet.
+    closed: bool
+        Whether the connection is gone.
+
+    Methods
+    -------
+    connect:
+        Opens a client for a "host:port" address.
+    send:
+        Sends a message to the server.
+    join:
+        Joins a game and waits for it to start.
+    send_action:
+        Sends an action of the local player.
+    next_action:
+        Returns the next action the server applied for a seat, if it has arrived.
+    close:
+        Closes the connection.
+    """
+    def __init__(self, host, port, timeout=5.0):
+        self.socket = socket.create_connection((host, port), timeout)
+        self.socket.settimeout(None)
+        self.inbox = queue.Queue()
+        self.start = None
+        self.seat = None
+        self.pending = None
+        self.closed = False
+        self.reader = threading.Thread(target=self.read, name="uno-client", daemon=True)
+        self.reader.start()
+
+    @classmethod
+    def connect(cls, address):
+        host, _, port = address.rpartition(":")
+        return cls(host or "127.0.0.1", int(port))
+
+    def read(self):
+        try:
+            for line in self.socket.makefile("rb"):
+                self.inbox.put(json.loads(line))
+        except (OSError, ValueError):
+            pass
+        self.inbox.put(None)
+
+    def send(self, message):
+        self.socket.sendall(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+    def join(self, players, difficulty="Easy", name="You", lobby=None, humans=1, seed=None, timeout=10.0):
+        self.send({"op": "join", "players": players, "humans": humans, "difficulty": difficulty,
+                   "name": name, "lobby": lobby, "seed": seed})
+        while True:
+            try:
+                message = self.inbox.get(timeout=timeout)
+            except queue.Empty:
+                raise ConnectionError("the server did not start the game")
+            if message is None:
+                raise ConnectionError("the server closed the connection")
+            if message.get("op") == "error":
+                raise ConnectionError(message["message"])
+            if message.get("op") == "start":
+                self.start = message
+                self.seat = message["seat"]
+                return message
+
+    def send_action(self, action):
+        self.send({"op": "act", "action": encode(action)})
+
+    def next_action(self, seat):
+        while self.pending is None:
+            try:
+                message = self.inbox.get_nowait()
+            except queue.Empty:
+                return None
+            if message is None:
+                self.closed = True
+                return None
+            if message.get("op") == "error":
+                print("server:", message["message"])
+            elif message.get("op") == "action" and message["seat"] != self.seat:
+                # our own actions come back too; they were applied when we made them
+                self.pending = message
+        if self.pending["seat"] != seat:
+            raise ConnectionError(f"out of sync with the server: expected seat {seat}, got {self.pending}")
+        message, self.pending = self.pending, None
+        return decode(message["action"])
+
+    def close(self):
+        self.closed = True
+        try:
+            self.socket.close()
+        except OSError:
+            pass
+
+
+class RemoteBot:
+    """
+    A class to represent a seat played somewhere else (another client or a server computer).
+
+    Methods
+    -------
+    choose:
+        Returns the next action the server applied for the current seat, or None while it has not arrived.
+    """
+    expensive = False
+
+    def __init__(self, client):
+        self.client = client
+
+    def choose(self, engine):
+        return self.client.next_action(engine.turn_index)
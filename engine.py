@@ -0,0 +1,574 @@
+"""
+Headless UNO rules engine.
+
+Nothing in this module imports pygame, so a whole game can be played on a
+display-less machine. The pygame front-end in main.py is a view over an
+Engine: it turns clicks and computer decisions into Actions, passes them to
+Engine.step and animates the card that step reports as moved.
+
+Cards are plain integer ids; cards.py holds their encoding, and each hand is
+a bitset so the legal moves of a turn are one AND with a precomputed
+PLAYABLE mask.
+
+A turn follows the house rules of the interactive game:
+
+1. dispose: the player puts any card from their hand at the bottom of the
+   discard pile.
+2. pick: the player draws a card.
+3. play: the player plays a card that matches the top of the discard pile.
+   If they have none they may draw one more card, and if that does not help
+   either they pass.
+4. color: after playing a Wild or Wild_Draw the player names the next colour.
+
+A player who was hit by Draw or Wild_Draw spends their next turn picking up
+the pending cards ("penalty"), and a player who plays their last card
+without shouting UNO picks up four cards instead.
+
+Every Engine shuffles with its own random.Random seeded from seed, so a game
+is reproduced exactly by the seed and the list of actions applied to it (see
+replay.py).
+
+A game seats 2 to MAX_SEATS players and plays with 1 to MAX_DECKS decks
+(by default the fewest that deal every hand). Nothing a turn does looks at
+more than the current seat and the next one, and every hand keeps its own
+score, so the cost of a turn does not grow with the number of seats.
+
+Engine.snapshot captures a game as a flat tuple of ints (card ids, counters
+and one (mask, count, points, flags, to_pick) struct per seat) that Engine.restore
+loads back in O(state) without allocating. save_game and load_game write a
+snapshot to a JSON file, which is how the game saves and resumes a table.
+"""
+import json
+import os
+import random
+from collections import namedtuple
+
+from cards import (CARDS, DECK_SIZE, FACE, IS_WILD, MAX_DECKS, NO_COLOR, PLAYABLE, Hand, Pile, card_of, color_index, colors,
+                   decks_needed, specialCards, wildCards)
+
+DISPOSE = "dispose"
+DRAW = "draw"
+PLAY = "play"
+COLOR = "color"
+SHOUT = "shout"
+PASS = "pass"
+
+Action = namedtuple("Action", ["kind", "card", "color"], defaults=(None, None))
+COMPUTER_NAMES = ["Max", "John", "Steve", "Paul", "Bruce", "Ron", "Sam", "Anna", "Kate", "Leo", "Mia", "Nina", "Omar",
+                  "Pia", "Raj", "Tom", "Uma", "Vic", "Zoe"]
+MAX_SEATS = len(COMPUTER_NAMES) + 1
+
+SNAPSHOT_VERSION = 2
+# bits of the flags word of a seat in a snapshot
+DISPOSED, PICKED, NEW_PICKED, SHOUTED, PICKINGCOLOR = 1, 2, 4, 8, 16
+
+
+class PlayerState:
+    """
+    A class to represent the rules-side state of one seat.
+
+    Attributes
+    ----------
+    id: int
+        The seat index.
+    name: str
+        The player's name.
+    cards: Hand
+        The card ids in the player's hand, as a bitset.
+    disposed: bool
+        Whether the player has disposed of a card this turn.
+    picked: bool
+        Whether the player has drawn their card this turn.
+    new_picked: bool
+        Whether the player has drawn the extra card for having no valid card.
+    to_pick: int
+        The number of cards the player still has to pick up.
+    shouted: bool
+        Whether the player has shouted "UNO".
+    pickingcolor: bool
+        Whether the player has played a wild card and still has to name a colour.
+
+    Methods
+    -------
+    end_turn:
+        Clears the per-turn flags.
+    copy:
+        Returns an independent copy of the seat.
+    flags:
+        Returns the per-turn flags packed into one int.
+    set_flags:
+        Unpacks the per-turn flags from an int made by flags.
+    """
+    def __init__(self, id, name, cards=()):
+        self.id = id
+        self.name = name
+        self.cards = Hand(cards)
+        self.disposed = False
+        self.picked = False
+        self.new_picked = False
+        self.to_pick = 0
+        self.shouted = False
+        self.pickingcolor = False
+
+    def end_turn(self):
+        self.disposed = False
+        self.picked = False
+        self.new_picked = False
+
+    def copy(self):
+        player = PlayerState.__new__(PlayerState)
+        player.__dict__.update(self.__dict__)
+        player.cards = self.cards.copy()
+        return player
+
+    def flags(self):
+        return (self.disposed*DISPOSED | self.picked*PICKED | self.new_picked*NEW_PICKED
+                | self.shouted*SHOUTED | self.pickingcolor*PICKINGCOLOR)
+
+    def set_flags(self, flags):
+        self.disposed = flags & DISPOSED != 0
+        self.picked = flags & PICKED != 0
+        self.new_picked = flags & NEW_PICKED != 0
+        self.shouted = flags & SHOUTED != 0
+        self.pickingcolor = flags & PICKINGCOLOR != 0
+
+
+class Engine:
+    """
+    A class to represent the rules of one game of UNO.
+
+    Attributes
+    ----------
+    players: list(PlayerState)
+        The seats at the table, in turn order.
+    n: int
+        The number of players.
+    deck: Pile
+        The draw pile; cards are drawn from index 0.
+    discard_deck: Pile
+        The discard pile; the top card is the last one and disposed cards go to index 0.
+    direction: int
+        The direction of play (either 1 or -1).
+    turn_index: int
+        The index of the player whose turn it is.
+    color_state: str
+        The colour named by the last wild card, or "" after any other card.
+    winner: int
+        The index of the player who won, or None while the game is running.
+    player_won: str
+        The name of the player who won.
+    turns: int
+        The number of times the turn has passed to another player.
+    steps: int
+        The number of actions applied.
+    reshuffles: int
+        The number of times the discard pile was shuffled back into the deck.
+    hand_size: int
+        The number of cards dealt to each player.
+    decks: int
+        The number of 108-card decks shuffled together; card id k is a copy of CARDS[k % DECK_SIZE].
+    seed: int
+        The seed of rng; random unless one is given.
+    rng: random.Random
+        The source of randomness for the shuffles of this game.
+    log: ReplayLog
+        Records every applied action, or None.
+
+    Methods
+    -------
+    current:
+        Returns the PlayerState whose turn it is.
+    phase:
+        Returns the step of the turn the current player is at.
+    playable_mask:
+        Returns the PLAYABLE mask for the top of the discard pile and the named colour.
+    can_play:
+        Returns whether a card can be played on the discard pile.
+    valid_cards:
+        Returns the cards in a hand that can be played on the discard pile.
+    legal_actions:
+        Returns every Action the current player may take.
+    step:
+        Applies an Action for the current player.
+    draw_card:
+        Moves the top card of the deck into a player's hand, reshuffling the discard pile when the deck runs out.
+    next_turn:
+        Advances to the next player, unless the current player's hand is empty.
+    calculate_score:
+        Returns the points left in every hand, from each hand's running total.
+    clone:
+        Returns an independent copy of the game for search.
+    snapshot:
+        Returns the state of the game as a compact tuple.
+    restore:
+        Loads a snapshot back into this game, in place.
+    from_snapshot:
+        Returns a new game built from a snapshot.
+    """
+    def __init__(self, names, hand_size=7, seed=None, decks=None):
+        if not 2 <= len(names) <= MAX_SEATS:
+            raise ValueError(f"a game needs 2 to {MAX_SEATS} players, not {len(names)}")
+        if decks is None:
+            decks = decks_needed(len(names), hand_size)
+        if not 1 <= decks <= MAX_DECKS or decks*DECK_SIZE < len(names)*hand_size + 2:
+            raise ValueError(f"{decks} deck(s) cannot deal {hand_size} cards to {len(names)} players")
+        self.hand_size = hand_size
+        self.decks = decks
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(self.seed)
+        self.log = None
+        self.deck = Pile(range(decks*DECK_SIZE), decks*DECK_SIZE)
+        self.deck.shuffle(self.rng)
+        self.discard_deck = Pile(capacity=decks*DECK_SIZE)
+        self.direction = -1
+        self.turn_index = 0
+        self.color_state = ""
+        self.winner = None
+        self.player_won = None
+        self.turns = 0
+        self.steps = 0
+        self.reshuffles = 0
+        self.n = len(names)
+        self.players = []
+        for i, name in enumerate(names):
+            player = PlayerState(i, name)
+            for j in range(hand_size):
+                player.cards.add(self.deck.popleft())
+            self.players.append(player)
+        self.discard_deck.append(self.deck.popleft())
+
+    @property
+    def top(self):
+        return self.discard_deck[-1]
+
+    def current(self):
+        return self.players[self.turn_index]
+
+    def phase(self):
+        if self.winner is not None:
+            return "won"
+        player = self.players[self.turn_index]
+        if player.to_pick != 0:
+            return "penalty"
+        if player.pickingcolor:
+            return "color"
+        if not player.disposed and player.cards:
+            return DISPOSE
+        if not player.picked:
+            return "pick"
+        return PLAY
+
+    def playable_mask(self):
+        return PLAYABLE[FACE[self.discard_deck[-1]]*(NO_COLOR+1) + color_index(self.color_state)]
+
+    def can_play(self, card):
+        return self.playable_mask() >> card & 1 == 1
+
+    def valid_cards(self, player=None):
+        if player is None:
+            player = self.players[self.turn_index]
+        return player.cards.playable(self.playable_mask())
+
+    def legal_actions(self):
+        phase = self.phase()
+        player = self.players[self.turn_index]
+        if phase == "won":
+            return []
+        if phase in ("penalty", "pick"):
+            return [Action(DRAW)]
+        if phase == "color":
+            return [Action(COLOR, color=color) for color in colors]
+        if phase == DISPOSE:
+            return [Action(DISPOSE, card) for card in player.cards]
+        actions = []
+        for card in self.valid_cards(player):
+            if IS_WILD[card]:
+                actions.extend(Action(PLAY, card, color) for color in colors)
+            else:
+                actions.append(Action(PLAY, card))
+        if not actions:
+            actions.append(Action(PASS) if player.new_picked else Action(DRAW))
+        elif len(player.cards) == 1 and not player.shouted:
+            actions.append(Action(SHOUT))
+        return actions
+
+    def step(self, action):
+        """
+        Applies action for the current player.
+
+        Returns the id of the card that moved (drawn, disposed or played), or
+        None when no card moved. Raises ValueError if the action is not
+        allowed at this point of the turn. Applied actions are passed on to
+        log when there is one.
+        """
+        card = self._apply(action)
+        self.steps += 1
+        if self.log is not None:
+            self.log.record(action)
+        return card
+
+    def _apply(self, action):
+        phase = self.phase()
+        player = self.players[self.turn_index]
+        kind = action.kind
+        if phase == "penalty" and kind == DRAW:
+            player.to_pick -= 1
+            card = self.draw_card(player)
+            if player.to_pick == 0:
+                player.end_turn()
+                self.next_turn()
+            return card
+        if phase == DISPOSE and kind == DISPOSE and action.card in player.cards:
+            player.cards.remove(action.card)
+            self.discard_deck.appendleft(action.card)
+            player.disposed = True
+            return action.card
+        if phase == "pick" and kind == DRAW:
+            player.disposed = True
+            player.picked = True
+            return self.draw_card(player)
+        if phase == "color" and kind == COLOR and action.color in colors:
+            self.choose_color(action.color)
+            return None
+        if phase == PLAY:
+            if kind == SHOUT and len(player.cards) == 1 and not player.shouted:
+                player.shouted = True
+                return None
+            if kind in (DRAW, PASS) and not player.cards.mask & self.playable_mask():
+                if kind == DRAW and not player.new_picked:
+                    player.new_picked = True
+                    return self.draw_card(player)
+                if kind == PASS and player.new_picked:
+                    player.end_turn()
+                    self.next_turn()
+                    return None
+            if kind == PLAY and action.card in player.cards and self.can_play(action.card):
+                return self.play_card(player, action.card, action.color)
+        raise ValueError(f"{action} is not allowed for {player.name} during {phase}")
+
+    def play_card(self, player, card, color=None):
+        if len(player.cards) == 1 and not player.shouted:
+            # forgot to shout UNO: pick up four cards instead of playing
+            player.to_pick = 4
+            player.end_turn()
+            return None
+        elif len(player.cards) == 1:
+            self.player_won = player.name
+        player.cards.remove(card)
+        self.color_state = ""
+        special = card_of(card)[2]
+        if special == "Reverse":
+            self.direction *= -1
+            if self.n == 2:
+                self.next_turn()
+        elif special == "Skip":
+            self.next_turn()
+        elif special == "Draw":
+            self.players[(self.turn_index + self.direction) % self.n].to_pick = 2
+        elif special == "Wild_Draw":
+            self.players[(self.turn_index + self.direction) % self.n].to_pick = 4
+            player.pickingcolor = True
+        elif special == "Wild":
+            player.pickingcolor = True
+        self.discard_deck.append(card)
+        if player.pickingcolor:
+            if color is not None:
+                self.choose_color(color)
+        else:
+            player.end_turn()
+            self.next_turn()
+        return card
+
+    def choose_color(self, color):
+        player = self.players[self.turn_index]
+        player.pickingcolor = False
+        self.color_state = color
+        player.end_turn()
+        self.next_turn()
+
+    def draw_card(self, player):
+        if self.deck:
+            card = self.deck.popleft()
+            player.cards.add(card)
+            if not self.deck:
+                self.deck.reshuffle_from(self.discard_deck, self.rng)
+                self.reshuffles += 1
+            return card
+
+    def next_turn(self):
+        if not self.players[self.turn_index].cards:
+            self.winner = self.turn_index
+            if self.player_won is None:
+                self.player_won = self.players[self.turn_index].name
+            return
+        self.turn_index = (self.turn_index + self.direction) % self.n
+        self.turns += 1
+
+    def calculate_score(self):
+        score = 0
+        for player in self.players:
+            score += player.cards.points
+        return score
+
+    def clone(self, rng=None):
+        """
+        Returns an independent copy of the game, without its log.
+
+        Only the piles and hands are copied (a list slice and two ints per
+        hand), so a search can clone the state thousands of times per move.
+        The clone shuffles with rng; without one it gets a copy of this
+        game's generator, which costs more but keeps both games on the same
+        random sequence.
+        """
+        engine = Engine.__new__(Engine)
+        engine.__dict__.update(self.__dict__)
+        if rng is None:
+            rng = random.Random()
+            rng.setstate(self.rng.getstate())
+        engine.rng = rng
+        engine.log = None
+        engine.deck = self.deck.copy()
+        engine.discard_deck = self.discard_deck.copy()
+        engine.players = [player.copy() for player in self.players]
+        return engine
+
+    def snapshot(self, rng=False):
+        """
+        Returns the state of the game as a tuple of ints and strings.
+
+        The piles are tuples of card ids and every seat is a (mask, count,
+        points, flags, to_pick) tuple, so a snapshot is a few hundred bytes and
+        shares nothing with the game. With rng the generator state is
+        included too, so a restored game goes on to shuffle exactly like
+        this one would have; without it (for search) the restored game keeps
+        its own generator.
+        """
+        return (SNAPSHOT_VERSION, self.seed, self.hand_size, self.decks, self.turn_index, self.direction,
+                color_index(self.color_state), -1 if self.winner is None else self.winner,
+                self.turns, self.steps, self.reshuffles, tuple(self.deck), tuple(self.discard_deck),
+                tuple((player.cards.mask, player.cards.count, player.cards.points, player.flags(), player.to_pick)
+                      for player in self.players),
+                tuple(player.name for player in self.players), self.player_won,
+                self.rng.getstate() if rng else None)
+
+    def restore(self, snapshot):
+        """
+        Loads a snapshot of a game with the same number of seats and decks
+        into this one, reusing its piles and hands.
+        """
+        if snapshot[0] != SNAPSHOT_VERSION:
+            raise ValueError(f"not a version {SNAPSHOT_VERSION} snapshot")
+        (version, self.seed, self.hand_size, decks, self.turn_index, self.direction, color, winner,
+         self.turns, self.steps, self.reshuffles, deck, discard, seats, names, self.player_won,
+         rng) = snapshot
+        if len(seats) != self.n or decks != self.decks:
+            raise ValueError(f"snapshot has {len(seats)} seats and {decks} deck(s), the game has {self.n} and {self.decks}")
+        self.color_state = colors[color] if color != NO_COLOR else ""
+        self.winner = None if winner < 0 else winner
+        self.deck.load(deck)
+        self.discard_deck.load(discard)
+        for player, (mask, count, points, flags, to_pick) in zip(self.players, seats):
+            player.cards.mask = mask
+            player.cards.count = count
+            player.cards.points = points
+            player.set_flags(flags)
+            player.to_pick = to_pick
+        if rng is not None:
+            # JSON turns the state's tuples into lists
+            self.rng.setstate((rng[0], tuple(rng[1]), rng[2]))
+        return self
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        names = snapshot[14]
+        engine = cls.__new__(cls)
+        engine.seed = snapshot[1]
+        engine.decks = snapshot[3]
+        engine.rng = random.Random(engine.seed)
+        engine.log = None
+        engine.deck = Pile(capacity=engine.decks*DECK_SIZE)
+        engine.discard_deck = Pile(capacity=engine.decks*DECK_SIZE)
+        engine.n = len(names)
+        engine.players = [PlayerState(i, name) for i, name in enumerate(names)]
+        return engine.restore(snapshot)
+
+
+def save_game(engine, path):
+    """
+    Writes a snapshot of engine, with its generator state, to a JSON file.
+
+    The file is written next to path and then renamed over it, so a crash
+    while saving leaves the previous save intact.
+    """
+    temporary = path + ".tmp"
+    with open(temporary, "w") as file:
+        json.dump(engine.snapshot(rng=True), file, separators=(",", ":"))
+    os.replace(temporary, path)
+
+
+def load_game(path):
+    """Returns the Engine saved to path by save_game."""
+    with open(path) as file:
+        return Engine.from_snapshot(json.load(file))
+
+
+class RandomBot:
+    """
+    A class to represent the computer player's strategy.
+
+    The bot disposes of a random card, plays a random valid card and names a
+    random colour for wild cards, exactly like the Computer player in main.py.
+
+    Attributes
+    ----------
+    expensive: bool
+        Whether choosing a move takes long enough to be run off the render thread.
+    rng: random.Random
+        The source of the bot's choices (the random module unless one is given).
+
+    Methods
+    -------
+    choose:
+        Returns the Action to take for the current player of an Engine.
+    """
+    expensive = False
+
+    def __init__(self, rng=random):
+        self.rng = rng
+
+    def choose(self, engine):
+        phase = engine.phase()
+        player = engine.current()
+        if phase in ("penalty", "pick"):
+            return Action(DRAW)
+        if phase == "color":
+            return Action(COLOR, color=self.rng.choice(colors))
+        if phase == DISPOSE:
+            return Action(DISPOSE, player.cards[self.rng.randint(0, len(player.cards)-1)])
+        validcards = engine.valid_cards(player)
+        if validcards == []:
+            return Action(PASS) if player.new_picked else Action(DRAW)
+        if len(validcards) == 1 and not player.shouted and len(player.cards) == 1:
+            return Action(SHOUT)
+        card = validcards[self.rng.randint(0, len(validcards)-1)]
+        if IS_WILD[card]:
+            return Action(PLAY, card, self.rng.choice(colors))
+        return Action(PLAY, card)
+
+
+def play_game(names, bots=None, max_steps=100000, seed=None, decks=None):
+    """
+    Plays one game between bots and returns the finished Engine.
+
+    bots maps seat index to a bot; seats without one use a RandomBot seeded
+    from the game's seed, so with only RandomBots the same seed plays the
+    same game.
+    """
+    engine = Engine(names, seed=seed, decks=decks)
+    default = RandomBot(random.Random(engine.seed + 1))
+    bots = bots or {}
+    for i in range(max_steps):
+        if engine.winner is not None:
+            break
+        engine.step(bots.get(engine.turn_index, default).choose(engine))
+    return engine
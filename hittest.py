@@ -0,0 +1,145 @@
+"""
+Spatial hit-testing and mouse-event routing.
+
+A HitGrid buckets clickable rects into a uniform grid of square cells, so
+finding what is under the pointer only looks at the few rects that overlap
+its cell instead of every widget on screen. Rects are added bottom to top,
+in the order they are drawn, and a lookup returns the top-most one.
+
+A Dispatcher keeps a HitGrid of a scene's targets, rebuilds it only when
+the scene's layout key changes, and sends every mouse event to the single
+top-most target under it, so handling input costs O(events) rather than
+O(events x widgets). Targets that have hovered/press/release methods
+(Buttons and Toggles) are driven through them; any other target (a card id)
+is just reported back when it is pressed.
+"""
+import pygame
+
+CELL_SIZE = 64
+
+
+class HitGrid:
+    """
+    A class to represent z-ordered rects indexed by a uniform grid.
+
+    Attributes
+    ----------
+    cell: int
+        The width and height of a grid cell, in pixels.
+    rects: list(pygame.Rect)
+        The rects, bottom-most first.
+    targets: list
+        The target of each rect.
+    cells: dict
+        Maps (column, row) to the indices of the rects overlapping that cell, in ascending order.
+
+    Methods
+    -------
+    build:
+        Replaces the contents with (rect, target) pairs given bottom-most first.
+    hit:
+        Returns the target of the top-most rect containing a point, or None.
+    """
+    def __init__(self, cell=CELL_SIZE):
+        self.cell = cell
+        self.rects = []
+        self.targets = []
+        self.cells = {}
+
+    def build(self, entries):
+        cell = self.cell
+        self.rects = []
+        self.targets = []
+        self.cells = {}
+        for index, (rect, target) in enumerate(entries):
+            self.rects.append(rect)
+            self.targets.append(target)
+            if rect.width <= 0 or rect.height <= 0:
+                continue
+            for column in range(rect.left//cell, (rect.right - 1)//cell + 1):
+                for row in range(rect.top//cell, (rect.bottom - 1)//cell + 1):
+                    self.cells.setdefault((column, row), []).append(index)
+        return self
+
+    def hit(self, position):
+        x, y = int(position[0]), int(position[1])
+        bucket = self.cells.get((x//self.cell, y//self.cell))
+        if bucket:
+            for index in reversed(bucket):
+                if self.rects[index].collidepoint(x, y):
+                    return self.targets[index]
+        return None
+
+    def __len__(self):
+        return len(self.targets)
+
+
+class Dispatcher:
+    """
+    A class to represent the mouse input of one scene.
+
+    Attributes
+    ----------
+    grid: HitGrid
+        The clickable targets of the current layout.
+    key: object
+        The layout the grid was built for.
+    hovered: object
+        The target under the pointer, or None.
+    pressed: object
+        The target the mouse button went down on, or None.
+    builds: int
+        The number of times the grid was rebuilt.
+
+    Methods
+    -------
+    rebuild:
+        Rebuilds the grid from (rect, target) pairs when the layout key changed.
+    dispatch:
+        Routes mouse events to the top-most target under each one and returns the targets pressed.
+    """
+    def __init__(self, cell=CELL_SIZE):
+        self.grid = HitGrid(cell)
+        self.key = None
+        self.hovered = None
+        self.pressed = None
+        self.builds = 0
+
+    def rebuild(self, key, entries):
+        """entries is only called (when it is a function) if the grid has to be rebuilt."""
+        if key == self.key and self.builds:
+            return self
+        self.grid.build(entries() if callable(entries) else entries)
+        self.key = key
+        self.builds += 1
+        if self.hovered is not None and self.hovered not in self.grid.targets:
+            self.hover(None)
+        return self
+
+    def hover(self, target):
+        if target is self.hovered:
+            return
+        if hasattr(self.hovered, "hovered"):
+            self.hovered.hovered(False)
+        if hasattr(target, "hovered"):
+            target.hovered(True)
+        self.hovered = target
+
+    def dispatch(self, events):
+        pressed = []
+        for event in events:
+            if event.type == pygame.MOUSEMOTION:
+                self.hover(self.grid.hit(event.pos))
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                target = self.grid.hit(event.pos)
+                if target is not None:
+                    self.pressed = target
+                    if hasattr(target, "press"):
+                        target.press()
+                    pressed.append(target)
+            elif event.type == pygame.MOUSEBUTTONUP:
+                target = self.grid.hit(event.pos)
+                if hasattr(self.pressed, "release"):
+                    self.pressed.release(self.pressed is target)
+                self.pressed = None
+        return pressed
@@ -0,0 +1,260 @@
+"""
+Information-Set Monte Carlo Tree Search computer opponent.
+
+The "Hard" difficulty. Before every decision the bot searches for as long as
+its per-move time budget allows:
+
+1. determinise: restore a scratch Engine from a snapshot of the real one and
+   redeal every card the bot cannot see (the other hands and the draw pile)
+   at random, keeping each hand's size, so the sample is consistent with
+   everything visible at the table;
+2. select and expand: walk a single tree shared by all samples, choosing
+   among the actions that are legal in this sample with UCB1 weighted by how
+   often each action was available;
+3. play out: finish the sampled game with RandomBot moves;
+4. back up: credit the win to every node whose mover won.
+
+Samples hold different copies of the duplicate cards, so tree edges are keyed
+by card face (FACE) rather than card id. The action played is the most
+visited one at the root.
+
+    python ismcts.py --games 50 --budget 0.05
+
+plays the bot against RandomBots and reports its win rate and playouts/sec,
+which is what to look at when sizing the budget for a machine.
+"""
+import argparse
+import math
+import random
+import time
+
+from cards import FACE
+from engine import Engine, RandomBot, play_game
+
+
+def action_key(action):
+    """Returns the search key of an Action: its kind, card face and colour."""
+    return action.kind, FACE[action.card] if action.card is not None else None, action.color
+
+
+def keyed_actions(engine):
+    """Maps the key of every legal action of an Engine to one such Action."""
+    return {action_key(action): action for action in engine.legal_actions()}
+
+
+def determinize(engine, observer, rng=random):
+    """Returns a clone of engine in which every card observer cannot see is redealt."""
+    return redeal(engine.clone(rng), observer, rng)
+
+
+def redeal(state, observer, rng=random):
+    """
+    Redeals every card observer cannot see in state, in place, and returns it.
+
+    The other players' hands and the draw pile are pooled, shuffled and dealt
+    back out with the same sizes. observer's hand and the discard pile are
+    left untouched.
+    """
+    hidden = list(state.deck)
+    for player in state.players:
+        if player.id != observer:
+            hidden.extend(player.cards)
+    rng.shuffle(hidden)
+    i = 0
+    for player in state.players:
+        if player.id != observer:
+            count = len(player.cards)
+            player.cards.clear()
+            for card in hidden[i:i+count]:
+                player.cards.add(card)
+            i += count
+    deck = state.deck
+    for j, card in enumerate(hidden[i:]):
+        deck.buffer[(deck.head + j) % len(deck.buffer)] = card
+    return state
+
+
+class Node:
+    """
+    A class to represent a node of the search tree.
+
+    Attributes
+    ----------
+    parent: Node
+        The node above this one, or None for the root.
+    key: tuple
+        The action_key of the action leading to this node.
+    player: int
+        The seat that took that action.
+    children: dict
+        Maps an action key to the child node.
+    visits: int
+        The number of playouts through this node.
+    wins: int
+        The number of those playouts won by player.
+    avail: int
+        The number of times this node's action was legal when its parent was visited.
+    """
+    __slots__ = ("parent", "key", "player", "children", "visits", "wins", "avail")
+
+    def __init__(self, parent=None, key=None, player=None):
+        self.parent = parent
+        self.key = key
+        self.player = player
+        self.children = {}
+        self.visits = 0
+        self.wins = 0
+        self.avail = 1
+
+    def ucb(self, exploration):
+        return self.wins/self.visits + exploration*math.sqrt(math.log(self.avail)/self.visits)
+
+
+class ISMCTSBot:
+    """
+    A class to represent the search-based computer player.
+
+    Attributes
+    ----------
+    expensive: bool
+        Always True: the game runs the search off the render thread.
+    budget: float
+        The wall-clock time searched per decision, in seconds.
+    exploration: float
+        The UCB1 exploration constant.
+    max_playout_steps: int
+        Playouts still running after this many actions count as a loss.
+    rng: random.Random
+        The source of randomness for determinisation and expansion.
+    policy: RandomBot
+        The playout policy.
+    playouts: int
+        The total number of playouts run.
+    searched: float
+        The total time spent searching, in seconds.
+    decisions: int
+        The number of decisions that needed a search.
+    last: dict
+        The playouts, time and playouts/sec of the last search.
+
+    Methods
+    -------
+    choose:
+        Returns the Action to take for the current player of an Engine.
+    search:
+        Runs playouts from an Engine until the budget runs out and returns the root Node.
+    playout:
+        Runs one determinised iteration of the search.
+    stats:
+        Returns the playout counters and playouts/sec over every search so far.
+    """
+    expensive = True
+
+    def __init__(self, budget=0.25, exploration=0.7, max_playout_steps=2000, rng=random):
+        self.budget = budget
+        self.exploration = exploration
+        self.max_playout_steps = max_playout_steps
+        self.rng = rng
+        self.policy = RandomBot(rng)
+        self.playouts = 0
+        self.searched = 0.0
+        self.decisions = 0
+        self.last = {}
+
+    def choose(self, engine):
+        actions = keyed_actions(engine)
+        if len(actions) == 1:
+            return next(iter(actions.values()))
+        root = self.search(engine)
+        best = max((child for key, child in root.children.items() if key in actions),
+                   key=lambda child: child.visits, default=None)
+        if best is None:
+            return self.policy.choose(engine)
+        return actions[best.key]
+
+    def search(self, engine):
+        root = Node()
+        observer = engine.turn_index
+        start = time.perf_counter()
+        deadline = start + self.budget
+        playouts = 0
+        # every playout restores the same scratch game instead of cloning a new one
+        snapshot = engine.snapshot()
+        state = Engine.from_snapshot(snapshot)
+        state.rng = self.rng
+        while True:
+            self.playout(root, redeal(state.restore(snapshot), observer, self.rng))
+            playouts += 1
+            if time.perf_counter() >= deadline:
+                break
+        elapsed = time.perf_counter() - start
+        self.playouts += playouts
+        self.searched += elapsed
+        self.decisions += 1
+        self.last = {"playouts": playouts, "seconds": elapsed, "playouts_per_sec": playouts/elapsed}
+        return root
+
+    def playout(self, root, state):
+        node = root
+        while state.winner is None:
+            actions = keyed_actions(state)
+            legal = []
+            untried = []
+            for key in actions:
+                child = node.children.get(key)
+                if child is None:
+                    untried.append(key)
+                else:
+                    child.avail += 1
+                    legal.append(child)
+            if untried:
+                key = self.rng.choice(untried)
+                child = Node(node, key, state.turn_index)
+                node.children[key] = child
+                node = child
+                state.step(actions[key])
+                break
+            node = max(legal, key=lambda child: child.ucb(self.exploration))
+            state.step(actions[node.key])
+        policy = self.policy
+        for i in range(self.max_playout_steps):
+            if state.winner is not None:
+                break
+            state.step(policy.choose(state))
+        winner = state.winner
+        while node is not None:
+            node.visits += 1
+            if node.player is not None and node.player == winner:
+                node.wins += 1
+            node = node.parent
+
+    def stats(self):
+        return {
+            "decisions": self.decisions,
+            "playouts": self.playouts,
+            "seconds": self.searched,
+            "playouts_per_sec": self.playouts/self.searched if self.searched else 0.0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play the ISMCTS bot against RandomBots and report its strength and speed.")
+    parser.add_argument("--games", type=int, default=20, help="number of games to play")
+    parser.add_argument("--players", type=int, default=4, help="seats per game (2-20); the bot takes seat 0")
+    parser.add_argument("--budget", type=float, default=0.05, help="search time per decision, in seconds")
+    args = parser.parse_args()
+
+    bot = ISMCTSBot(budget=args.budget)
+    names = [f"Bot{i+1}" for i in range(args.players)]
+    wins = 0
+    for i in range(args.games):
+        wins += play_game(names, bots={0: bot}).winner == 0
+    stats = bot.stats()
+    print(f"{args.games} games with {args.players} players, {args.budget}s per decision")
+    print(f"  win rate:     {wins/args.games:.2%} (random play: {1/args.players:.2%})")
+    print(f"  decisions:    {stats['decisions']}")
+    print(f"  playouts/sec: {stats['playouts_per_sec']:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""
+Bot ladder: rank computer strategies by playing them against each other.
+
+    python ladder.py --strategies random greedy ismcts-10ms --rounds 50
+    python ladder.py --report            # print the standings of a run
+
+Every combination of --players strategies meets --rounds times, rotating
+the seats each round. The schedule is fixed by the run's configuration, so
+match n always seats the same strategies with the same seed. Matches are
+played by a pool of worker processes and come back in schedule order; the
+main process updates the Elo ratings one match at a time (the winner beats
+every other seat, the K factor split between them) and writes results and
+ratings to SQLite, --batch matches per transaction, in WAL mode so the
+standings can be read while a run is going.
+
+Because a match and the ratings it produced are committed together, a run
+that was interrupted picks up where it stopped: rerunning the same command
+skips every match already in the database and continues from the stored
+ratings.
+
+Games are played with the engine's bots and scored with
+Engine.calculate_score, which is what the Table and Computer players of
+main.py use; main.py itself opens a window on import, so workers cannot
+load it.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from cards import COLOR, IS_WILD, NO_COLOR, SCORE, colors
+from engine import Action, Engine, RandomBot, COLOR as COLOR_ACTION, DISPOSE, DRAW, PASS, PLAY, SHOUT
+from ismcts import ISMCTSBot
+
+INITIAL_RATING = 1500.0
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    name TEXT PRIMARY KEY,
+    config TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS matches (
+    run TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    seats TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    winner INTEGER,
+    score INTEGER,
+    steps INTEGER NOT NULL,
+    turns INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (run, id)
+);
+CREATE TABLE IF NOT EXISTS ratings (
+    run TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    rating REAL NOT NULL,
+    games INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    PRIMARY KEY (run, strategy)
+);
+"""
+
+
+class GreedyBot:
+    """
+    A class to represent a computer player that sheds points as fast as it can.
+
+    It disposes of its most valuable coloured card, keeping wild cards for
+    when nothing else matches, plays its most valuable valid card and names
+    the colour it holds most of.
+
+    Attributes
+    ----------
+    expensive: bool
+        Always False.
+    rng: random.Random
+        Breaks ties between colours.
+
+    Methods
+    -------
+    choose:
+        Returns the Action to take for the current player of an Engine.
+    """
+    expensive = False
+
+    def __init__(self, rng=random):
+        self.rng = rng
+
+    def best_color(self, cards):
+        counts = [0]*(NO_COLOR + 1)
+        for card in cards:
+            counts[COLOR[card]] += 1
+        most = max(counts[:NO_COLOR])
+        return self.rng.choice([color for color, count in zip(colors, counts) if count == most])
+
+    def choose(self, engine):
+        phase = engine.phase()
+        player = engine.current()
+        if phase in ("penalty", "pick"):
+            return Action(DRAW)
+        if phase == "color":
+            return Action(COLOR_ACTION, color=self.best_color(player.cards))
+        if phase == DISPOSE:
+            cards = [card for card in player.cards if not IS_WILD[card]] or list(player.cards)
+            return Action(DISPOSE, max(cards, key=SCORE.__getitem__))
+        validcards = engine.valid_cards(player)
+        if not validcards:
+            return Action(PASS) if player.new_picked else Action(DRAW)
+        if len(player.cards) == 1 and not player.shouted:
+            return Action(SHOUT)
+        card = max(validcards, key=SCORE.__getitem__)
+        if IS_WILD[card]:
+            return Action(PLAY, card, self.best_color(c for c in player.cards if c != card))
+        return Action(PLAY, card)
+
+
+STRATEGIES = {
+    "random": RandomBot,
+    "greedy": GreedyBot,
+    "ismcts-10ms": lambda rng: ISMCTSBot(budget=0.01, rng=rng),
+    "ismcts-50ms": lambda rng: ISMCTSBot(budget=0.05, rng=rng),
+}
+
+
+def play_match(match, max_steps=20000):
+    """
+    Plays one scheduled match and returns its result.
+
+    match is (id, seats, seed) with seats a tuple of strategy names. Runs in
+    the worker processes.
+    """
+    id, seats, seed = match
+    start = time.perf_counter()
+    engine = Engine([f"{name}#{seat}" for seat, name in enumerate(seats)], seed=seed)
+    bots = [STRATEGIES[name](random.Random(seed*len(seats) + seat)) for seat, name in enumerate(seats)]
+    for i in range(max_steps):
+        if engine.winner is not None:
+            break
+        engine.step(bots[engine.turn_index].choose(engine))
+    return {
+        "id": id,
+        "seats": list(seats),
+        "seed": seed,
+        "winner": engine.winner,
+        "score": engine.calculate_score() if engine.winner is not None else None,
+        "steps": engine.steps,
+        "turns": engine.turns,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def expected(rating, other):
+    """Returns the chance that a player rated rating beats one rated other."""
+    return 1/(1 + 10**((other - rating)/400))
+
+
+class Ladder:
+    """
+    A class to represent one ladder run stored in an SQLite database.
+
+    Attributes
+    ----------
+    db: sqlite3.Connection
+        The results database, in WAL mode.
+    run: str
+        The name of the run; one database can hold many.
+    strategies: list(str)
+        The strategies being ranked.
+    players: int
+        The seats per match.
+    rounds: int
+        How many times every combination of strategies meets.
+    seed: int
+        The seed the match seeds are derived from.
+    k: float
+        The Elo K factor.
+    ratings: dict
+        Maps a strategy to its current rating.
+    games: dict
+        Maps a strategy to its finished matches.
+    wins: dict
+        Maps a strategy to its won matches.
+
+    Methods
+    -------
+    schedule:
+        Returns every match of the run as (id, seats, seed), in order.
+    pending:
+        Returns the scheduled matches that are not in the database yet.
+    rate:
+        Updates the ratings with one result.
+    record:
+        Writes a batch of results and the ratings after them in one transaction.
+    play:
+        Plays the pending matches on a process pool.
+    standings:
+        Returns the strategies with their rating, games and wins, best first.
+    """
+    def __init__(self, path, run="default", strategies=("random", "greedy"), players=2, rounds=10, seed=0, k=24.0):
+        unknown = [name for name in strategies if name not in STRATEGIES]
+        if unknown:
+            raise ValueError(f"unknown strategies: {', '.join(unknown)}")
+        if not 2 <= players <= len(strategies):
+            raise ValueError(f"matches of {players} seats need at least {players} strategies")
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.run = run
+        self.strategies = list(strategies)
+        self.players = players
+        self.rounds = rounds
+        self.seed = seed
+        self.k = k
+        config = json.dumps({"strategies": self.strategies, "players": players, "rounds": rounds, "seed": seed, "k": k})
+        row = self.db.execute("SELECT config FROM runs WHERE name = ?", (run,)).fetchone()
+        if row is None:
+            with self.db:
+                self.db.execute("INSERT INTO runs VALUES (?, ?, ?)", (run, config, time.time()))
+        elif json.loads(row[0]) != json.loads(config):
+            raise ValueError(f"run {run!r} was started with {row[0]}; resume it with the same options or pick another --run")
+        self.ratings = {name: INITIAL_RATING for name in self.strategies}
+        self.games = dict.fromkeys(self.strategies, 0)
+        self.wins = dict.fromkeys(self.strategies, 0)
+        for strategy, rating, games, wins in self.db.execute(
+                "SELECT strategy, rating, games, wins FROM ratings WHERE run = ?", (run,)):
+            self.ratings[strategy], self.games[strategy], self.wins[strategy] = rating, games, wins
+
+    @classmethod
+    def load(cls, path, run="default"):
+        """Opens an existing run with the options it was started with."""
+        db = sqlite3.connect(path)
+        row = db.execute("SELECT config FROM runs WHERE name = ?", (run,)).fetchone()
+        db.close()
+        if row is None:
+            raise ValueError(f"no run {run!r} in {path}")
+        return cls(path, run, **json.loads(row[0]))
+
+    def schedule(self):
+        matches = []
+        for round in range(self.rounds):
+            for group in itertools.combinations(self.strategies, self.players):
+                shift = round % self.players
+                seats = group[shift:] + group[:shift]
+                matches.append((len(matches), seats, self.seed*1000003 + len(matches)))
+        return matches
+
+    def pending(self):
+        done = {id for id, in self.db.execute("SELECT id FROM matches WHERE run = ?", (self.run,))}
+        return [match for match in self.schedule() if match[0] not in done]
+
+    def rate(self, result):
+        seats = result["seats"]
+        for name in seats:
+            self.games[name] += 1
+        if result["winner"] is None:
+            return
+        winner = seats[result["winner"]]
+        self.wins[winner] += 1
+        k = self.k/(len(seats) - 1)
+        deltas = dict.fromkeys(seats, 0.0)
+        for name in seats:
+            if name != winner:
+                delta = k*(1 - expected(self.ratings[winner], self.ratings[name]))
+                deltas[winner] += delta
+                deltas[name] -= delta
+        for name, delta in deltas.items():
+            self.ratings[name] += delta
+
+    def record(self, results):
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO matches VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(self.run, r["id"], json.dumps(r["seats"]), r["seed"], r["winner"], r["score"], r["steps"],
+                  r["turns"], r["seconds"]) for r in results])
+            self.db.executemany(
+                "INSERT OR REPLACE INTO ratings VALUES (?, ?, ?, ?, ?)",
+                [(self.run, name, self.ratings[name], self.games[name], self.wins[name]) for name in self.strategies])
+
+    def play(self, workers=None, batch=50, progress=None):
+        """
+        Plays every pending match and returns how many were played.
+
+        Results are rated in schedule order, so a run rates the same way no
+        matter how many workers played it. progress, if given, is called
+        with the number of matches played after each batch is committed.
+        """
+        matches = self.pending()
+        workers = workers or os.cpu_count() or 1
+        played = 0
+        results = []
+
+        def flush():
+            nonlocal results
+            if results:
+                self.record(results)
+                results = []
+                if progress:
+                    progress(played)
+
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            outcomes = pool.map(play_match, matches, chunksize=max(1, min(16, len(matches)//(workers*4) or 1))) if pool else map(play_match, matches)
+            for result in outcomes:
+                self.rate(result)
+                results.append(result)
+                played += 1
+                if len(results) >= batch:
+                    flush()
+        finally:
+            # whatever finished is kept; the rest is played on the next run
+            flush()
+            if pool:
+                pool.shutdown(cancel_futures=True)
+        return played
+
+    def standings(self):
+        return sorted(({"strategy": name, "rating": round(self.ratings[name], 1), "games": self.games[name],
+                        "wins": self.wins[name]} for name in self.strategies),
+                      key=lambda row: row["rating"], reverse=True)
+
+    def close(self):
+        self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank computer strategies with Elo ratings stored in SQLite.")
+    parser.add_argument("--db", default="ladder.sqlite", help="results database")
+    parser.add_argument("--run", default="default", help="name of the run to start or resume")
+    parser.add_argument("--strategies", nargs="+", default=["random", "greedy", "ismcts-10ms"], choices=sorted(STRATEGIES),
+                        help="strategies to rank")
+    parser.add_argument("--players", type=int, default=2, help="seats per match")
+    parser.add_argument("--rounds", type=int, default=20, help="meetings of every combination of strategies")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the schedule")
+    parser.add_argument("--k", type=float, default=24.0, help="Elo K factor")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--batch", type=int, default=50, help="matches written per transaction")
+    parser.add_argument("--report", action="store_true", help="only print the standings of the run")
+    args = parser.parse_args()
+
+    try:
+        if args.report:
+            ladder = Ladder.load(args.db, args.run)
+        else:
+            ladder = Ladder(args.db, args.run, args.strategies, args.players, args.rounds, args.seed, args.k)
+    except ValueError as error:
+        parser.error(str(error))
+    if not args.report:
+        total = len(ladder.schedule())
+        done = total - len(ladder.pending())
+        if done:
+            print(f"resuming {args.run}: {done} of {total} matches already played")
+        start = time.perf_counter()
+        played = ladder.play(args.workers, args.batch,
+                             progress=lambda n: print(f"  {done + n}/{total} matches", end="\r", flush=True))
+        elapsed = time.perf_counter() - start
+        if played:
+            print()
+        print(f"played {played} matches in {elapsed:.1f}s ({played/(elapsed or 1):.1f} matches/sec)")
+    print(f"{'strategy':<14}{'rating':>8}{'games':>7}{'wins':>7}")
+    for row in ladder.standings():
+        print(f"{row['strategy']:<14}{row['rating']:>8.1f}{row['games']:>7}{row['wins']:>7}")
+    ladder.close()
+
+
+if __name__ == "__main__":
+    main()
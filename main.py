@@ -1,11 +1,19 @@
 import pygame
-from random import shuffle,randint,choice
+import random
 import math
+import os
 from helper import *
-
-colors = ["Red", "Blue", "Green", "Yellow"]
-specialCards = ["Skip", "Reverse", "Draw"]
-wildCards    = ["Wild_Draw", "Wild"]
+from assets import backgrounds,card_images,images,text_cache,Preloader
+from render import Renderer,draw_rect
+from profiler import profiler
+from ismcts import ISMCTSBot
+from thinker import Thinker
+from tween import animations
+from hittest import Dispatcher
+from replay import ReplayLog
+from client import RemoteClient,RemoteBot
+from cards import DECK_SIZE,MAX_DECKS,card_of,decks_needed
+from engine import Engine,RandomBot,save_game,load_game,Action,COMPUTER_NAMES,MAX_SEATS,CARDS,colors,specialCards,wildCards,DISPOSE,DRAW,PLAY,COLOR,SHOUT,PASS
 menu = {
   1: 'start',
   2: 'quit'
@@ -14,8 +22,12 @@ menu = {
 
 pygame.init()
 screen=pygame.display.set_mode()
+renderer=Renderer(screen)
 clock = pygame.time.Clock()
 font = pygame.font.Font('freesansbold.ttf', 40)
+profile_font = pygame.font.SysFont('couriernew,monospace', 18)
+IDLE_TIMEOUT = 1000
+DEAL_STAGGER = 0.15
 pygame.mixer.music.load("Assets/Sound/Uno.wav")
 
 class Card:
@@ -38,29 +50,27 @@ class Card:
         Represents the angle at which the card is rotated.
     moving: bool
         Determines whether a card is moving or not.
-    moving_timer:
-        A timer for an animation procedure.
+    moveTo: pygame.Vector2
+        Where the card is moving to.
     moving_duration:
-        The duration for which the card moves (animation).
+        The duration for which the card moves (animation), in seconds: 0.5 with an ease-out curve (it was 1).
 
     Methods
     -------
     move:
-        Moves the card.
+        Moves the card with a tween on the shared animation scheduler, optionally after a delay.
+    arrived:
+        Called by the scheduler when the card reaches its destination.
     load_images:
-        Loads the assets (card pngs) onto the cards.
+        Fetches the card image from the shared card_images cache, which decodes each png only once.
     calculate_rect:
         Calculates the size of the cards with the loaded images.
-    canPlayedOn:
-        Returns a conditional checking whether a card can be played on a given card.
     draw:
         Draws a card on the given screen.
     set_hidden:
-        Hides the card from view.
+        Hides the card from view. Does nothing if the card is already in that state.
     rotate:
-        Rotates card and updates its image to reflect the rotation.
-    update:
-        Checks if the card is moving, and returns True or False, otherwise checks if player has clicked a card.
+        Rotates card and updates its image to reflect the rotation. Does nothing if the angle is unchanged.
     """
     def __init__(self,position,color="",number="",special="",hidden=False,angle=0):
         self.position=pygame.Vector2(*position)
@@ -71,15 +81,18 @@ class Card:
         self.angle=angle
         self.load_image()
         self.moving=False
-        self.moving_timer=0
-        self.moving_duration=1
+        self.moveTo=self.position
+        self.moving_duration=0.5
     
-    def move(self,position):
+    def move(self,position,delay=0):
         self.moving=True
         self.moveTo=pygame.Vector2(*position)
-        
-        
+        animations.move(self,self.moveTo,self.moving_duration,delay=delay,on_done=self.arrived)
+    
+    def arrived(self):
+        self.moving=False
     
+    @profiler.timed("Card.load_image")
     def load_image(self):
         if not self.hidden:
             path=f"Assets/UoN_Cards/{self.color}_{self.number}.png"
@@ -90,96 +103,107 @@ class Card:
                     path=f"Assets/UoN_Cards/{self.special}.png"
         else:
             path="Assets/UoN_Cards/Deck.png"
-        image=pygame.image.load(path).convert_alpha()
-        if self.angle!=0:
-            image = pygame.transform.rotate(image, self.angle)
-            
-        
-        self.image=pygame.transform.smoothscale(image,(image.get_width()/3,image.get_height()/3))
-        
+        self.image=card_images.get(path,self.hidden,self.angle)
         self.calculate_rect()
     
     def calculate_rect(self):
         self.rect=pygame.Rect(self.position,self.image.get_size())
     
-    def canPlayedOn(self,card):
-        return (self.color==card.color and self.color!="")  or (self.number == card.number and self.number!="") or (self.special== card.special and self.special !="") or self.special in wildCards
-    
     def draw(self,screen):
         screen.blit(self.image,self.position)
     
     def set_hidden(self,state):
+        if state==self.hidden:
+            return
         self.hidden=state
         self.load_image()
     
     def rotate(self,angle):
+        if angle==self.angle:
+            return
         self.angle=angle
         self.load_image()
-    
-    def update(self,events,dt):
-        if self.moving:
-            self.position=self.position.lerp(self.moveTo,self.moving_timer)
-            self.moving_timer+=dt
-            if self.moving_timer>=self.moving_duration:
-                self.moving=False
-                self.position=self.moveTo
-                self.moving_timer=0
-                return True
-            return False
-        else:
-            for event in events:
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    if self.rect.collidepoint(pygame.mouse.get_pos()):
-                        print(self.color,self.number,self.special)
-                        return True
-            return False
         
 
 class Table:
     """
     A class to represent the game Table.
 
+    The rules of the game live in an engine.Engine; the Table is the view
+    over it. It owns one Card sprite per card id, forwards player actions
+    to the engine and animates the card each action moved.
+
     Attributes
     ----------
     table_bg: pygame.Surface
-        Render object of the game background (fit to full_screen).
+        Render object of the game background (fit to full_screen), shared through the backgrounds cache.
+    static: pygame.Surface
+        The background with the face-down deck stack already drawn on it.
+    static_stack: int
+        The number of deck cards drawn on the static layer.
+    engine: Engine
+        The headless rules engine holding the deck, hands and turn state.
     players: list
         The players at the table.
-    deck: list
-        The deck of cards for the game.
-    discard_deck: list 
-        Stores the discard deck where the played cards are placed.
+    cards: list
+        The Card sprite of every card, indexed by engine card id.
     discard_deck_position: pygame.Vector2 
         Render object of the position of the discard deck on the screen.
     direction: int
-        Determines the direction of play (either 1 or -1).
+        Determines the direction of play (either 1 or -1). Read from the engine.
     turn_index: int
-        The index of the player whose turn it is.
+        The index of the player whose turn it is. Read from the engine.
     color_state: str
-        The current color state of the game.
+        The current color state of the game. Read from the engine.
     state: str
-        The current state of the game (e.g. "normal", "transition").
-    player_won: Obj 
-        The player who won the game, if any.
-    won: bool
-        Indicates whether the game has been won.
+        The current state of the game: "normal", "transition" while cards are moving, or "Won".
+    player_won: str 
+        The name of the player who won the game, if any. Read from the engine.
+    won: int
+        The index of the player who won the game, if any. Read from the engine.
+    animations: Scheduler
+        The shared tween scheduler that moves the cards; the table advances it once per frame.
+    delay: float
+        How long the next card moved this frame waits before leaving, so cards moved together fan out.
     n: int
-        The number of players in the game.
+        The number of players in the game (2 to engine.MAX_SEATS).
+    decks: int
+        The number of decks shuffled together (1 to cards.MAX_DECKS); by default the fewest that deal every hand.
     player_names: list
         A list of computer player names.
-    cards: list
-        Stores the cards for each player.
     rotation: float
         The rotation of the players around the table.
     points: list
         Determines the points on the screen where the players are positioned.
     number_of_players: int 
         The number of players in the game (excluding yourself).
+    difficulty: str
+        "Easy" for RandomBot computer players, "Hard" for ISMCTSBot ones.
+    seed: int
+        The seed of the game; the same seed deals the same cards to the same names.
+    rng: random.Random
+        The table's own source of randomness, used for the names; each computer player gets a generator seeded from seed and its seat.
+    log: ReplayLog
+        The replay log of the game, or None when no replay_dir was given.
+    remote: RemoteClient
+        The connection to the game server when the game is played through one, else None.
+        The other seats then play the actions the server sends.
+    notice: pygame.Surface
+        Render object of a message shown above the table (the server was lost), or None.
+    save_path: str
+        The file the game is saved to after every action, or None. The save is removed once the game is won.
+    
     
     
-
     Methods
     -------
+    step:
+        Applies an action for the current player to the engine, and sends it to the server if it is the human's.
+    play_offline:
+        Hands the seats the server played to local computer players once the connection is lost.
+    apply:
+        Applies an action for the current player and starts the animation of the card it moved.
+        Cards moved in the same frame leave DEAL_STAGGER seconds apart.
     next_turn:
         Advances the game to the next players turn, whilst checking if their hand is empty or not.
     calculate_score:
@@ -187,39 +211,58 @@ class Table:
     add_player:
         Adds a computer player to the table
     initialize_cards:
-        Initializes the deck of cards (108 cards).
+        Creates a Card sprite for each engine card, 108 per deck.
+    sync_cards:
+        Turns and flips every Card sprite to match where the engine holds its card.
+    static_layer:
+        Returns the background with the deck stack, rebuilding it only when the stack height changes.
     draw:
         Draws the cards, deck and discard pile to the screen.
+    busy:
+        Returns whether the table will change without any input (a card is moving, a computer is acting or a draw is automatic).
     update:
-        Checks the state of the round, and updates according to player action/round status.
+        Advances the animations, checks the state of the round, and updates according to player action/round status.
+        A penalty is picked up in a single frame, so all of its cards are in flight at once.
     """
-    def __init__(self,n) -> None:
-        self.table_bg = pygame.transform.smoothscale(pygame.image.load("Assets/Tables/Table_0.png"),screen.get_size())
+    def __init__(self,n,difficulty="Easy",seed=None,replay_dir=None,remote=None,engine=None,save_path=None,decks=None) -> None:
+        self.table_bg = backgrounds.get(0,screen.get_size())
         self.players=[]
-        self.deck=[]
-        self.discard_deck=[]
+        self.cards=[]
+        self.static=None
+        self.static_stack=None
         self.discard_deck_position=pygame.Vector2(screen.get_width()/2.5,screen.get_height()/2.4)
-        self.direction=-1
-        self.turn_index=0
-        self.color_state=""
         self.state="normal"
-        self.player_won=None
-        self.won=None
-        self.initialize_cards()
+        self.animations=animations
+        self.delay=0
         self.n=n
-        cards=[]
-        self.player_names=["Max","John","Steve","Paul","Bruce","Ron"]
-        shuffle(self.player_names)
-        for i in range(7):
-            cards.append(self.deck.pop(0))
-        self.players.append(Human(0,"You",(screen.get_width()/2,screen.get_height()-screen.get_height()/4),cards,self))
+        self.difficulty=difficulty
+        self.remote=remote
+        self.notice=None
+        self.save_path=save_path
+        self.log=None
+        if engine:
+            # resuming a saved game: its seat count and seed win over the selection
+            self.engine=engine
+            self.n=n=engine.n
+            self.seed=engine.seed
+            self.rng=random.Random(self.seed)
+        else:
+            if remote:
+                seed=remote.start["seed"]
+                decks=remote.start.get("decks",decks)
+            self.seed=seed if seed is not None else random.randrange(2**32)
+            self.rng=random.Random(self.seed)
+            self.player_names=list(COMPUTER_NAMES)
+            self.rng.shuffle(self.player_names)
+            names=remote.start["players"] if remote else ["You"]+self.player_names[:n-1]
+            self.engine=Engine(names,seed=self.seed,decks=decks)
+            self.log=ReplayLog(os.path.join(replay_dir,f"uno-{self.seed}.jsonl"),self.engine) if replay_dir else None
+        self.decks=self.engine.decks
+        self.initialize_cards()
+        self.players.append(Human(0,"You",(screen.get_width()/2,screen.get_height()-screen.get_height()/4),self))
         number_of_players=n-1
         rotation=math.radians(360/(number_of_players+1))
         points=polygon(number_of_players+1,(screen.get_height()/6)*2,rotation,(screen.get_width()/2,(screen.get_height()/5)*2))
-        print(points)
-        
-        if len(self.deck)>0:
-            self.discard_deck.append(self.deck.pop(0))
         
         for i in range(number_of_players):
             angle=(i+1)*(360/(number_of_players+1))
@@ -230,113 +273,264 @@ class Table:
             elif angle<180:
                 position=point[0]+screen.get_width()/8,point[1]
             self.add_player(i,angle,position)
+        self.sync_cards()
+    
+    @property
+    def turn_index(self):
+        return self.engine.turn_index
+    
+    @property
+    def direction(self):
+        return self.engine.direction
+    
+    @property
+    def color_state(self):
+        return self.engine.color_state
+    
+    @property
+    def won(self):
+        return self.engine.winner
+    
+    @property
+    def player_won(self):
+        return self.engine.player_won
+    
+    def step(self,action):
+        player=self.players[self.turn_index]
+        card_id=self.engine.step(action)
+        if self.remote and player.type=="Human":
+            try:
+                self.remote.send_action(action)
+            except OSError as error:
+                self.play_offline(error)
+        if self.save_path:
+            if self.won is None:
+                save_game(self.engine,self.save_path)
+            elif os.path.exists(self.save_path):
+                os.remove(self.save_path)
+        return card_id
+    
+    def apply(self,action):
+        player=self.players[self.turn_index]
+        card_id=self.step(action)
+        if card_id is None:
+            return None
+        card=self.cards[card_id]
+        if action.kind==DRAW:
+            card.rotate(player.angle)
+            card.set_hidden(player.type!="Human")
+            card.move(player.position,self.delay)
+        else:
+            if action.kind==PLAY:
+                card.set_hidden(False)
+            card.rotate(0)
+            card.move(self.discard_deck_position,self.delay)
+        self.delay+=DEAL_STAGGER
+        return card
+    
+    def play_offline(self,reason):
+        # the local engine holds the whole game, so it can go on without the server
+        print(f"lost the server ({reason}), playing on locally")
+        self.remote.close()
+        self.remote=None
+        self.notice=text_cache.render(font,"Server lost - playing on locally",True,"black")
+        for player in self.players[1:]:
+            player.bot=RandomBot(random.Random(f"{self.seed}:{player.id}"))
     
     def next_turn(self):
-        if self.players[self.turn_index].cards==[]:
-            self.won=True
-            return
-        self.turn_index= (self.turn_index + self.direction) % self.n
+        self.engine.next_turn()
         
         
     def calculate_score(self):
-        score=0
-        for player in self.players:
-            for card in player.cards:
-                if card.number!="":
-                    score+=int(card.number)
-                elif card.special in specialCards:
-                    score+=20
-                elif card.special in wildCards:
-                    score+=50
-                else:
-                    1
-        return score
+        return self.engine.calculate_score()
             
     
     def add_player(self,index,angle,position):
-        cards=[]
-        name=self.player_names.pop(0)
-        for i in range(7):
-            card=self.deck.pop(0)
-            card.set_hidden(True)
-            cards.append(card)
-        
-        self.players.append(Computer(index+1,name,position,cards,self,angle))
+        # every seat gets its own generator: Hard bots draw from theirs on a worker thread
+        rng=random.Random(f"{self.seed}:{index+1}")
+        if self.remote:
+            bot=RemoteBot(self.remote)
+        elif self.difficulty=="Hard":
+            bot=ISMCTSBot(rng=rng)
+        else:
+            bot=RandomBot(rng)
+        self.players.append(Computer(index+1,self.engine.players[index+1].name,position,self,angle,bot))
         
     
     
     
     def initialize_cards(self):
-        for color in colors:
-            self.deck.append(Card((0,0),color=color,number="0"))
-            for i in range(2):
-                for number in range(1,10):
-                    self.deck.append(Card((0,0),color=color,number=number))
-                
-                for special in specialCards:
-                    self.deck.append(Card((0,0),color=color,special=special))
-                    
-        for i in range(4):
-            for wild in wildCards:
-                self.deck.append(Card((0,0),special=wild))
-                
-            
-
-        shuffle(self.deck)
+        for card_id in range(self.engine.decks*DECK_SIZE):
+            color,number,special=card_of(card_id)
+            self.cards.append(Card((0,0),color=color,number=number,special=special,hidden=True))
+    
+    def sync_cards(self):
+        for card_id in self.engine.discard_deck:
+            self.cards[card_id].set_hidden(False)
+            self.cards[card_id].rotate(0)
+        for player in self.players:
+            for card in player.cards:
+                card.set_hidden(player.type!="Human")
+                card.rotate(player.angle)
     
+    def static_layer(self,stack):
+        if self.static_stack!=stack:
+            self.static=self.table_bg.convert()
+            image=card_images.get("Assets/UoN_Cards/Deck.png",True)
+            for i in range(stack):
+                self.static.blit(image,(i*2+screen.get_width()/1.8,i*2+screen.get_height()/2.4))
+            self.static_stack=stack
+        return self.static
+    
+    @profiler.timed("Table.draw")
     def draw(self,screen:pygame.Surface):
-        screen.blit(self.table_bg,(0,0))
-        
-        for i,card in enumerate(self.deck):
-            if i>9:
-                break
+        deck=self.engine.deck
+        discard_deck=self.engine.discard_deck
+        stack=min(len(deck),10)
+        for i in range(stack):
+            card=self.cards[deck[i]]
             card.position=pygame.Vector2(i*2+screen.get_width()/1.8,i*2+screen.get_height()/2.4)
             card.set_hidden(True)
-            card.draw(screen)
+        screen.blit(self.static_layer(stack),(0,0))
         if self.state=="transition":
-            self.discard_deck[0].draw(screen)
-        if len(self.discard_deck)>1:
-            card=self.discard_deck[-2]
+            self.cards[discard_deck[0]].draw(screen)
+        if len(discard_deck)>1:
+            card=self.cards[discard_deck[-2]]
             if not card.moving:
                 card.position=pygame.Vector2(screen.get_width()/2.5,screen.get_height()/2.4 )
             card.draw(screen)
-        card=self.discard_deck[-1]
+        card=self.cards[discard_deck[-1]]
         if not card.moving:
             card.position=pygame.Vector2(screen.get_width()/2.5,screen.get_height()/2.4 )
         card.draw(screen)
         
         if self.color_state!="":
-            text=font.render(self.color_state,True,"black")
+            text=text_cache.render(font,self.color_state,True,"black")
             screen.blit(text,(screen.get_width()/2,screen.get_height()/3))
         
 
         for player in self.players:
             player.draw(screen)
+        if self.notice:
+            screen.blit(self.notice,(screen.get_width()/2-self.notice.get_width()/2,screen.get_height()/20))
         if self.state=="Won":
-            text=font.render(f"Player {self.won+1} Wins",True,"black")
+            text=text_cache.render(font,f"Player {self.won+1} Wins",True,"black")
             screen.blit(text,(screen.get_width()/2,screen.get_height()/2))
+    def busy(self):
+        if self.state!="normal" or self.won!=None:
+            return True
+        return not self.players[self.turn_index].waiting_for_input()
+    
+    @profiler.timed("Table.update")
     def update(self,events,dt):
+        self.animations.update(dt)
         if self.state=="normal":
+            if self.won!=None:
+                self.state="Won"
+                if self.log:
+                    self.log.close()
+                if self.remote:
+                    self.remote.close()
+                return
+            self.delay=0
+            if self.remote and self.remote.closed:
+                self.play_offline("the server closed the connection")
             player=self.players[self.turn_index]
-            self.movingcard=player.update(events,dt)
+            try:
+                moved=player.update(events,dt)
+                while moved and self.won is None and self.engine.phase()=="penalty" and self.players[self.turn_index] is player:
+                    moved=player.update([],dt)
+            except ConnectionError as error:
+                # the server sent an action this table cannot follow
+                self.play_offline(error)
             
-            if self.movingcard:
+            if self.animations.busy:
                 self.state="transition"
-            if self.won!=None and not self.state=="transition":
-                self.state="Won"
                 
                 
         elif self.state=="transition":
-            if self.movingcard.update(events,dt):
+            if not self.animations.busy:
                 self.state="normal"
         else:
             return self.player_won,self.calculate_score()
             
 
+class HandLayout:
+    """
+    A class to represent the cached layout of a player's hand.
+
+    The position, valid-card lift and rect of every card are computed in one
+    pass and reused until a card is added or removed, the turn changes, the
+    top of the discard pile (or the named colour) changes or the lift state
+    of the turn changes.
+
+    Attributes
+    ----------
+    player: player
+        The player whose hand is laid out.
+    key: tuple
+        The state the layout was computed for.
+    cards: list(Card)
+        The Card sprites of the hand, in display order.
+    ids: list(int)
+        The engine card id of each of those sprites.
+    positions: list(pygame.Vector2)
+        The resting position of each card.
+    rects: list(pygame.Rect)
+        The rect of each card at its resting position.
+
+    Methods
+    -------
+    signature:
+        Returns the state the layout depends on.
+    update:
+        Recomputes the layout if the signature changed, and returns itself.
+    """
+    def __init__(self,player):
+        self.player=player
+        self.key=None
+        self.cards=[]
+        self.ids=[]
+        self.positions=[]
+        self.rects=[]
+    
+    def signature(self):
+        player=self.player
+        table=player.table
+        lifted=player.type=="Human" and table.turn_index==player.id and player.disposed and player.picked and table.state=="normal"
+        return player.rules.cards.mask,table.turn_index,table.engine.discard_deck[-1],table.color_state,lifted
+    
+    def update(self):
+        key=self.signature()
+        if key==self.key:
+            return self
+        self.key=key
+        player=self.player
+        hand=player.rules.cards
+        playable=player.table.engine.playable_mask() if key[-1] else 0
+        x=player.position[0]-(len(hand)/2*player.diff)-100
+        self.cards=[]
+        self.ids=[]
+        self.positions=[]
+        self.rects=[]
+        for i,card_id in enumerate(hand):
+            card=player.table.cards[card_id]
+            y_diff=50 if playable>>card_id&1 else 0
+            position=pygame.Vector2(x+i*player.diff,player.position[1]-y_diff)
+            self.cards.append(card)
+            self.ids.append(card_id)
+            self.positions.append(position)
+            self.rects.append(pygame.Rect(position,card.image.get_size()))
+        return self
+    
+
 class player:
     """
     A class to represent a player.
 
+    The rules-side state of the seat (hand, per-turn flags) lives in the
+    engine; the player reads it through the rules property.
+
     Attributes
     ----------
     id: int
@@ -345,6 +539,8 @@ class player:
         The player's name.
     position: int, float or tuple of (x,y) coordinates 
         The player's position on the screen (a tuple of x and y coordinates).
+    rules: PlayerState
+        The engine's state for this seat.
     cards: list(Obj)
         A list of Card objects representing the player's hand.
     table: Obj
@@ -356,8 +552,14 @@ class player:
         horizontal offset which determines the spacing between the cards.
     type: str
         Represents the type of player, in this case, Human.
-    state: str
-        Represents the current state of the player.
+    disposed: bool
+        Whether the player has already disposed of a card during their turn.
+    picked: bool
+        Whether the player has already picked up a card during their turn.
+    new_picked: bool
+        Whether the player has picked up the extra card for having no valid card.
+    to_pick: int
+        The number of cards the player is required to pick up.
     shouted: bool
         Determines whether the player has shouted "UNO".
     player_name_text: Obj
@@ -365,74 +567,99 @@ class player:
     name_position: tuple of (x,y) coordinates
         The position at which the player's name is displayed. It is based on
         their position, size of card and an offset.
+    layout: HandLayout
+        The cached positions and rects of the cards in the player's hand.
     
 
     Methods
     -------
     shout_uno:
-        Set shouted variable to True, and plays a sound.
+        Shouts "UNO" through the engine, and plays a sound.
     getValidCards:
         Returns a list of indices of the cards in a hand that can be played on current discard pile
     draw_card:
-        Draws a card from the deck and adds it to the player's hand. If deck is empty, reshuffle discard pile and set new deck.
+        Draws a card from the deck and adds it to the player's hand. If deck is empty, the engine reshuffles the discard pile into a new deck.
     draw:
         Draws player's cards and name onto the game screen.
+    draw_hand:
+        Draws the cards of the hand at their layout positions, one blit per card.
+    waiting_for_input:
+        Returns whether the player's turn is stalled until the user does something. Always False for computer players.
     """
-    def __init__(self,id,name,position,cards,table,angle=0) -> None:
+    def __init__(self,id,name,position,table,angle=0) -> None:
         self.id=id
         self.name=name
-        self.cards=cards
         self.position=position
         self.angle=angle
         self.diff=40
         self.table=table
         self.type=""
-        self.state="normal"
-        self.shouted=False
-        self.player_name_text=font.render(self.name,True,"black")
-        self.name_position=self.position[0]-self.player_name_text.get_width()/2-self.cards[0].rect.width/2,self.position[1]+self.cards[0].rect.height+40
-        
+        self.player_name_text=text_cache.render(font,self.name,True,"black")
+        # placed from the size of a card back, so a resumed seat with an empty hand has a label too
+        back=card_images.get("Assets/UoN_Cards/Deck.png",True)
+        self.name_position=self.position[0]-self.player_name_text.get_width()/2-back.get_width()/2,self.position[1]+back.get_height()+40
+        self.layout=HandLayout(self)
+    
+    @property
+    def rules(self):
+        return self.table.engine.players[self.id]
+    
+    @property
+    def cards(self):
+        return [self.table.cards[card] for card in self.rules.cards]
+    
+    @property
+    def disposed(self):
+        return self.rules.disposed
+    
+    @property
+    def picked(self):
+        return self.rules.picked
+    
+    @property
+    def new_picked(self):
+        return self.rules.new_picked
+    
+    @property
+    def to_pick(self):
+        return self.rules.to_pick
+    
+    @property
+    def shouted(self):
+        return self.rules.shouted
     
     def shout_uno(self):
-        self.shouted=True
+        self.table.step(Action(SHOUT))
         pygame.mixer.music.play()
     
     def getValidCards(self):
         validcards=[]
-        for i,card in enumerate(self.cards):
-            if card.canPlayedOn(self.table.discard_deck[len(self.table.discard_deck)-1]):
+        playable=self.table.engine.playable_mask()
+        for i,card in enumerate(self.rules.cards):
+            if playable>>card&1:
                 validcards.append(i)
         return validcards
     
     def draw_card(self):
-        if self.table.deck!=[]:
-            card=self.table.deck.pop(0)
-            self.cards.append(card)
-            if self.table.deck==[]:
-                self.table.deck=self.table.discard_deck[:-1]
-                self.table.discard_deck=[self.table.discard_deck[-1]]
-                shuffle(self.table.deck)
-            card.rotate(self.angle)
-            card.move(self.position)
-            if self.type=="Human":
-                card.set_hidden(False)
-            return card
+        return self.table.apply(Action(DRAW))
+    
+    def waiting_for_input(self):
+        return False
         
         
     
+    @profiler.timed("player.draw")
     def draw(self,screen):
-        for i,card in enumerate(self.cards):
-            y_diff=0
-            if self.table.turn_index==self.id:
-                if self.type=="Human" and i in self.getValidCards() :
-                    if self.disposed and self.picked and self.table.state=="normal":
-                        y_diff=50
+        self.draw_hand(screen,self.layout.update())
+        screen.blit(self.player_name_text,(self.name_position))
+    
+    def draw_hand(self,screen,layout):
+        for card,position,rect in zip(layout.cards,layout.positions,layout.rects):
             if not card.moving:
-                card.position=pygame.Vector2(self.position[0]-(len(self.cards)/2*self.diff)+i*self.diff-100,self.position[1]-y_diff)
-                card.calculate_rect()
+                card.position=position
+                card.rect=rect
             card.angle=self.angle
             card.draw(screen)
-        screen.blit(self.player_name_text,(self.name_position))
            
 
 class Human(player):
@@ -447,22 +674,10 @@ class Human(player):
         The player's name.
     position: int, float or tuple of (x,y) coordinates.
         Represents players position on the table.
-    cards: list(Obj)
-        Represents the cards in the player's hand.
     table: Obj
         Represents the game table.
     type: str
         Represents the type of player, in this case, Human.
-    disposed: bool
-        Determines whether the player has already disposed of a card during their turn.
-    picked: bool
-        Determines whether the player has already picked up a card during their turn.
-    to_pick: integer
-        The number of cards the player is required to pick up.
-    waspicking: bool
-        Determines whether the player was picking up cards in the previous turn.
-    new_picked: bool
-        Determines whether the player has just picked up a card.
     uno_button: Obj
         The "UNO" button.
     color_buttons: list(Obj)
@@ -471,48 +686,47 @@ class Human(player):
         Determines whether the player is currently picking a color.
     canshoutUno: bool
         Determines whether the player can shout "UNO" (i.e. if they only have one card remaining in their hand).
+    input: Dispatcher
+        Routes clicks to the top-most card or button, indexed once per layout and step of the turn.
 
     Methods
     -------
     select_color:
-        Sets the card on top of the discard pile's colour, 
-        pickingcolor is set to False, updates color_state and advances
-        to next turn.
+        Names the colour of the wild card on top of the discard pile through
+        the engine, which advances to the next turn.
     draw:
         Draws all inherited from player class, and also checks if player is
-        picking colour, in which case draws the buttons for colours.
+        picking colour, in which case draws the buttons for colours, or can
+        shout "UNO", in which case draws the "UNO" button.
+    input_targets:
+        Returns the clickable (rect, target) pairs of a step of the turn, bottom-most first.
     update:
-        Updates the game state. Checks a variety of conditions: if a player
-        is picking up a card, disposing a card, picking a colour, has won. If
-        True, updates game state accordingly.
+        Turns clicks into engine actions for the current step of the turn:
+        disposing a card, picking up cards, playing a card or picking a colour.
 
     """
-    def __init__(self,id,name,position,cards,table) -> None:
-        super().__init__(id,name,position,cards,table)
+    def __init__(self,id,name,position,table) -> None:
+        super().__init__(id,name,position,table)
         self.type="Human"
-        self.disposed=False
-        self.picked=False
-        self.to_pick=0
-        self.waspicking=False
-        self.new_picked=False
         self.uno_button=Button(((screen.get_width()/8)*7,self.position[1]+100),"UNO",self.shout_uno)
         self.color_buttons=[]
-        self.pickingcolor=False
-        self.canshoutUno=False
         
         
         for i,color in enumerate(colors):
             self.color_buttons.append(Button((screen.get_width()/2-300+(150*i),self.position[1]-55),color,lambda c=color:self.select_color(c)))
+        self.input=Dispatcher()
+    
+    @property
+    def pickingcolor(self):
+        return self.rules.pickingcolor
+    
+    @property
+    def canshoutUno(self):
+        return self.table.turn_index==self.id and self.table.engine.phase()==PLAY and len(self.rules.cards)==1 and not self.shouted and len(self.getValidCards())==1
     
     def select_color(self,color):
         if color:
-            self.table.discard_deck[-1].color=color
-            self.pickingcolor=False
-            self.table.color_state=color
-            self.table.next_turn()
-            self.disposed=False
-            self.picked=False
-            self.new_picked=False
+            self.table.step(Action(COLOR,color=color))
     
     def draw(self, screen):
         super().draw(screen)
@@ -520,87 +734,43 @@ class Human(player):
         if self.pickingcolor:
             for b in self.color_buttons:
                 b.draw(screen)
+        if self.canshoutUno:
+            self.uno_button.draw(screen)
        
-    def update(self,events,dt):        
-        if self.to_pick!=0:
-            self.to_pick-=1
-            self.waspicking=True
+    def waiting_for_input(self):
+        phase=self.table.engine.phase()
+        if phase==PLAY:
+            return self.table.engine.valid_cards(self.rules)!=[]
+        return phase in (DISPOSE,"color")
+    
+    def input_targets(self,layout,phase):
+        if phase==DISPOSE:
+            return list(zip(layout.rects,layout.ids))
+        if phase==PLAY:
+            playable=self.table.engine.playable_mask()
+            targets=[(rect,card_id) for rect,card_id in zip(layout.rects,layout.ids) if playable>>card_id&1]
+            if self.canshoutUno:
+                targets.append((self.uno_button.rect,self.uno_button))
+            return targets
+        if phase=="color":
+            return [(b.rect,b) for b in self.color_buttons]
+        return []
+    
+    def update(self,events,dt):
+        phase=self.table.engine.phase()
+        if phase in ("penalty","pick"):
             return self.draw_card()
-        elif self.waspicking:
-            self.table.next_turn()
-            self.waspicking=False
-        elif self.table.turn_index==self.id:
-            
-            if not self.disposed:
-                for i in range(len(self.cards)-1,-1,-1):
-                    if self.cards[i].update(events,dt):
-                        card=self.cards.pop(i)
-                        
-                        self.table.discard_deck.insert(0,card)
-                        
-                        card.move(self.table.discard_deck_position)
-                        self.disposed=True
-                        return card
-                
-            elif self.disposed and not self.picked:
-                self.picked=True
+        if phase==PLAY and self.table.engine.valid_cards(self.rules)==[]:
+            if not self.new_picked:
                 return self.draw_card()
-                
-            elif self.picked and not self.pickingcolor:
-                if self.cards==[]:
-                    self.table.won=self.id
-                    return
-                validcards=self.getValidCards()
-                if validcards==[] and not self.new_picked:
-                    self.new_picked=True
-                    return self.draw_card()
-                validcards=self.getValidCards()
-                if len(validcards)==1 and not self.shouted and len(self.cards)==1:
-                    self.uno_button.draw(screen)
-                    self.uno_button.update(events)
-                for i in reversed(validcards):
-                    if self.cards[i].update(events,dt):
-                        if len(self.cards)==1 and not self.shouted:
-                            self.to_pick=4
-                            break
-                        elif len(self.cards)==1:
-                            self.table.player_won=self.name
-                            
-                        card=self.cards.pop(i)
-                        self.table.color_state=""
-                        if card.special=="Reverse":
-                            self.table.direction*=-1
-                            if len(self.table.players)==2:
-                                self.table.next_turn()
-                        elif card.special=="Skip":
-                            self.table.next_turn()
-                        elif card.special=="Draw":
-                            self.table.players[(self.table.turn_index + self.table.direction) % self.table.n].to_pick=2
-                        elif card.special=="Wild_Draw":
-                            self.table.players[(self.table.turn_index + self.table.direction) % self.table.n].to_pick=4
-                            self.pickingcolor=True
-                        elif card.special=="Wild":
-                            self.pickingcolor=True
-                            
-                        self.table.discard_deck.append(card)
-                        
-                        if not self.pickingcolor:
-                            self.table.next_turn()
-                            self.disposed=False
-                            self.picked=False
-                            self.new_picked=False
-                        card.move(self.table.discard_deck_position)
-                        
-                        return card
-                validcards=self.getValidCards()
-                if validcards==[]:
-                    self.table.next_turn()
-                    self.disposed=False
-                    self.new_picked=False
-                    self.picked=False
-            elif self.pickingcolor:
-                for b in self.color_buttons:
-                    b.update(events)
+            return self.table.apply(Action(PASS))
+        
+        layout=self.layout.update()
+        self.input.rebuild((layout.key,phase,self.canshoutUno),lambda: self.input_targets(layout,phase))
+        for target in self.input.dispatch(events):
+            # cards are routed as their ids, buttons run their own callbacks
+            if type(target) is int:
+                return self.table.apply(Action(DISPOSE if phase==DISPOSE else PLAY,target))
                 
 
 class Computer(player):
@@ -615,8 +785,6 @@ class Computer(player):
         Representing the player's name.
     position: int, float or tuple of (x,y) coordinates.
         Represents players position on the table.
-    cards: list(Obj)
-        Represents the cards in the player's hand.
     table: Obj
         Represents the game table.
     angle: int 
@@ -626,109 +794,68 @@ class Computer(player):
     diff: int
         Calculates the position of each card the player holds. Used as a
         horizontal offset which determines the spacing between the cards.
-    disposed: bool
-        Indicates whether the player has already disposed of a card during their turn.
-    picked: bool
-        Indicates whether the player has already picked up a card during their turn.
-    to_pick: int
-        The number of cards the player is required to pick up.
-    waspicking: bool
-        Indicates whether the player was picking up cards in the previous turn.
-    new_picked: bool
-        Indicates whether the player has just picked up a card.
+    bot: RandomBot, ISMCTSBot or RemoteBot
+        The strategy that picks the computer's actions (RandomBot unless one is given).
+    thinker: Thinker
+        Runs an expensive bot's decisions on a worker thread so the table keeps animating.
+    thinking_text: Obj
+        A rendered "Thinking..." shown under the name while the thinker is busy.
 
     Methods
     -------
+    draw:
+        Draws the player, and the thinking indicator while a decision is being made.
+    draw_hand:
+        Draws the face-down cards at rest as one cached composite (see CardImageCache.fan), and the moving ones on top.
     update:
-        Updates the game state. Runs through a number of conditionals based on
-        game rules to check CPU's hand, play and update the game state accordingly.
+        Asks the bot for the next action for the current step of the turn
+        and applies it to the table. Expensive bots are asked through the
+        thinker, and nothing happens until their answer is ready.
 
     """
-    def __init__(self,id,name,position,cards,table,angle) -> None:
-        super().__init__(id,name,position,cards,table,angle)
-        for card in self.cards:
-            #card.hidden=True
-            card.rotate(self.angle)
+    def __init__(self,id,name,position,table,angle,bot=None) -> None:
+        super().__init__(id,name,position,table,angle)
         self.type="Computer"
         self.diff=10
-        self.disposed=False
-        self.picked=False
-        self.to_pick=0
-        self.waspicking=False
-        self.new_picked=False
+        self.bot=bot or RandomBot()
+        self.thinker=Thinker(self.bot)
+        self.thinking_text=text_cache.render(profile_font,"Thinking...",True,"black")
 
         
+    def draw_hand(self,screen,layout):
+        resting=0
+        moving=[]
+        for card,position,rect in zip(layout.cards,layout.positions,layout.rects):
+            if card.moving:
+                moving.append(card)
+            else:
+                # still placed, so a card starts its next move from its slot
+                card.position=position
+                card.rect=rect
+                resting+=1
+        if resting:
+            screen.blit(card_images.fan(resting,self.angle,self.diff),layout.positions[0])
+        for card in moving:
+            card.draw(screen)
+    
+    def draw(self,screen):
+        super().draw(screen)
+        if self.thinker.thinking:
+            screen.blit(self.thinking_text,(self.name_position[0],self.name_position[1]+self.player_name_text.get_height()))
+        
     def update(self,events,dt):
-        if self.to_pick!=0:
-            self.to_pick-=1
-            self.waspicking=True
-            return self.draw_card()
-        elif self.waspicking:
-            self.table.next_turn()
-            self.waspicking=False
-        elif self.table.turn_index==self.id:
-            if not self.disposed:
-                if len(self.cards)>0:
-                    card=self.cards.pop(randint(0,len(self.cards)-1))
-                    self.table.discard_deck.insert(0,card)
-                    card.rotate(0)
-                    card.move(self.table.discard_deck_position)
-                    self.disposed=True
-                    return card
-            elif self.disposed and not self.picked:
-                self.picked=True
-                return self.draw_card()
-            
-            elif self.picked:
-                validcards=self.getValidCards()
-                if validcards==[] and not self.new_picked:
-                    self.new_picked=True
-                    return self.draw_card()
-                
-                validcards=self.getValidCards()
-                if len(validcards)==1 and not self.shouted and len(self.cards)==1:
-                    self.shout_uno()
-                    
-                    self.table.player_won=self.name
-                if len(validcards)>0:
-                    
-                    self.table.color_state=""
-                    card=self.cards.pop(validcards[randint(0,len(validcards)-1)])
-                    if card.special=="Reverse":
-                        self.table.direction*=-1
-                        if len(self.table.players)==2:
-                            self.table.next_turn()
-                        
-                    card.set_hidden(False)
-                    if card.special=="Wild":
-                        card.color=choice(colors)
-                        self.table.color_state=card.color
-                    if card.special=="Skip":
-                        self.table.next_turn()
-                    if card.special=="Draw":
-                        
-                        self.table.players[(self.table.turn_index + self.table.direction) % self.table.n].to_pick=2
-                        
-                    if card.special=="Wild_Draw":
-                        card.color=choice(colors)
-                        self.table.color_state=card.color
-                        
-                        self.table.players[(self.table.turn_index + self.table.direction) % self.table.n].to_pick=4
-                    card.rotate(0)
-                    self.table.discard_deck.append(card)
-                    
-                    self.table.next_turn()
-                    card.move(self.table.discard_deck_position)
-                    self.disposed=False
-                    self.picked=False
-                    self.new_picked=False
-                    return card
-                validcards=self.getValidCards()
-                if validcards==[]:
-                    self.table.next_turn()
-                    self.disposed=False
-                    self.picked=False
-                    self.new_picked=False
+        if self.bot.expensive:
+            action=self.thinker.poll(self.table.engine)
+            if action is None:
+                return
+        else:
+            action=self.bot.choose(self.table.engine)
+            if action is None:
+                return
+        if action.kind==SHOUT:
+            self.shout_uno()
+            return
+        return self.table.apply(action)
                     
                     
 class Button:
@@ -766,9 +893,14 @@ class Button:
     draw:
         Draws the button object to the screen, and updates the color attribute
         depending on the hover action.
-    update:
-        Checks for mouse events and updates the 'hover' and 'clicked' attributes
-        accordingly. If a button is clicked, the 'callback' function fires.
+    hovered:
+        Sets the 'hover' attribute when the cursor enters or leaves the button.
+    press:
+        Marks the button as clicked when the mouse button goes down on it.
+    release:
+        Fires the 'callback' function if the mouse button comes back up on a clicked button.
+    
+    Buttons get their mouse events from a Dispatcher, which calls the methods above.
     """
     def __init__(self,position,text="",callback=None,image=None):
         self.position=position
@@ -781,9 +913,9 @@ class Button:
         else:
             self.rect=pygame.Rect(self.position,(150,100))
             self.rect.center=self.position
-        self.text_surface=font.render(text,True,"black")
+        self.text_surface=text_cache.render(font,text,True,"black")
         self.text_rect=self.text_surface.get_rect(center=self.position)
-        self.hover_text_surface=font.render(text,True,"white")
+        self.hover_text_surface=text_cache.render(font,text,True,"white")
         self.hover=False
         self.color="black"
         self.clicked=False
@@ -798,25 +930,22 @@ class Button:
             else:
                 self.color="black"
                 screen.blit(self.text_surface,self.text_rect)
-            pygame.draw.rect(screen,self.color,self.rect,width=5)
+            draw_rect(screen,self.color,self.rect,5)
 
         
     
-    def update(self,events):
-        for event in events:
-            if event.type == pygame.MOUSEMOTION:
-                if self.rect.collidepoint(pygame.mouse.get_pos()):
-                    self.hover=True
-                else:
-                    self.hover=False
-            elif event.type ==pygame.MOUSEBUTTONDOWN:
-                if self.rect.collidepoint(pygame.mouse.get_pos()):
-                    self.clicked=True
-            elif event.type ==pygame.MOUSEBUTTONUP:
-                if self.rect.collidepoint(pygame.mouse.get_pos()) and self.clicked:
-                    self.callback()
-                else:
-                    self.clicked=False
+    def hovered(self,inside):
+        self.hover=inside
+    
+    def press(self):
+        self.clicked=True
+    
+    def release(self,inside):
+        if inside and self.clicked:
+            self.callback()
+        else:
+            self.clicked=False
+
 class Toggle:
     """
     A class representing a toggle feature for switching colours in buttons.
@@ -854,9 +983,14 @@ class Toggle:
         Sets the state of the toggle based on a state argument.
     draw:
         Checks value of 'hover' and 'state'. If True, turns button white, else leaves black.
-    update:
-        Checks for mouse events and updates the 'hover' and 'clicked' attributes
-        accordingly. If a button is clicked, the 'callback' function fires.
+    hovered:
+        Sets the 'hover' attribute when the cursor enters or leaves the button.
+    press:
+        Marks the button as clicked when the mouse button goes down on it.
+    release:
+        Fires the 'callback' function and switches the toggle on if the mouse button comes back up on a clicked button.
+    
+    Buttons get their mouse events from a Dispatcher, which calls the methods above.
     """
     def __init__(self,position,text="",callback=None,toggable=False):
         self.position=position
@@ -867,9 +1001,9 @@ class Toggle:
         
         self.rect=pygame.Rect(self.position,(150,100))
         self.rect.center=self.position
-        self.text_surface=font.render(text,True,"black")
+        self.text_surface=text_cache.render(font,text,True,"black")
         self.text_rect=self.text_surface.get_rect(center=self.position)
-        self.hover_text_surface=font.render(text,True,"white")
+        self.hover_text_surface=text_cache.render(font,text,True,"white")
         self.hover=False
         self.color="black"
         self.clicked=False
@@ -884,28 +1018,32 @@ class Toggle:
         else:
             self.color="black"
             screen.blit(self.text_surface,self.text_rect)
-        pygame.draw.rect(screen,self.color,self.rect,width=5)
+        draw_rect(screen,self.color,self.rect,5)
 
         
     
+    def hovered(self,inside):
+        self.hover=inside
+    
+    def press(self):
+        self.clicked=True
+    
+    def release(self,inside):
+        if inside and self.clicked:
+            self.callback()
+            self.toggle(True)
+        else:
+            self.clicked=False
+    
     def update(self,events):
-        
         for event in events:
-            
             if event.type ==pygame.MOUSEBUTTONDOWN:
-                if self.rect.collidepoint(pygame.mouse.get_pos()):
-                    self.clicked=True
+                if self.rect.collidepoint(event.pos):
+                    self.press()
             elif event.type ==pygame.MOUSEBUTTONUP:
-                if self.rect.collidepoint(pygame.mouse.get_pos()) and self.clicked:
-                    
-                    self.callback()
-                    self.toggle(True)
-                else:
-                    self.clicked=False
-            if self.rect.collidepoint(pygame.mouse.get_pos()) :
-                    self.hover=True
-            elif not self.state:
-                self.hover=False
+                self.release(self.rect.collidepoint(event.pos))
+            elif event.type ==pygame.MOUSEMOTION:
+                self.hovered(self.rect.collidepoint(event.pos))
 
 class Start_Screen:
     """
@@ -914,7 +1052,7 @@ class Start_Screen:
     Attributes
     ----------
     table_bg: pygame.Surface
-        Render object of the game background (fit to full_screen).
+        Render object of the game background (fit to full_screen), shared through the backgrounds cache.
     logo: pygame.image
         Image object of the UNO logo.
     title: pygame.Obj
@@ -927,6 +1065,10 @@ class Start_Screen:
         Determines the state of play.
     buttons: list
         Represents the buttons available on the screen.
+    preloader: Preloader
+        (Optional) The image preloader whose progress is shown while it runs.
+    input: Dispatcher
+        Routes mouse events to the button under the pointer.
 
 
     Methods
@@ -936,18 +1078,20 @@ class Start_Screen:
     pressed:
         Determines if a button has been selected, and stores which button has been clicked on via numeric identifier.
     draw:
-       Draws the logo, title, table_bg and buttons to the screen.
+       Draws the logo, title, table_bg and buttons to the screen, and a progress bar while images are still loading.
     update:
-        Calls the update method from the Buttons class for the button in the list of buttons.
+        Routes the events to the buttons through the input Dispatcher.
     """
-    def __init__(self):
-      self.table_bg = pygame.transform.smoothscale(pygame.image.load("Assets/Tables/Table_0.png"),screen.get_size())
-      self.logo = pygame.image.load("Assets/UNO_Logo.png")
-      self.title=font.render("Welcome To Uno","True","black")
+    def __init__(self,preloader=None):
+      self.preloader=preloader
+      self.table_bg = backgrounds.get(0,screen.get_size())
+      self.logo = images.get("Assets/UNO_Logo.png")
+      self.title=text_cache.render(font,"Welcome To Uno",True,"black")
       self.title_rect=self.title.get_rect(center=(screen.get_width()/2,screen.get_height()/2.1))
       self.selected=0
       self.play=False
       self.buttons=[]
+      self.input=Dispatcher()
       x=1
       y=0
       
@@ -973,11 +1117,17 @@ class Start_Screen:
         screen.blit(self.title,self.title_rect)
         for button in self.buttons:
             button.draw(screen)
+        if self.preloader and not self.preloader.done:
+            bar=pygame.Rect(0,0,screen.get_width()/3,20)
+            bar.center=(screen.get_width()/2,screen.get_height()-60)
+            loaded=bar.copy()
+            loaded.width=int(bar.width*self.preloader.progress)
+            draw_rect(screen,"black",loaded)
+            draw_rect(screen,"black",bar,2)
             
     
     def update(self,events):
-        for button in self.buttons:
-            button.update(events)
+        self.input.rebuild(None,lambda: [(button.rect,button) for button in self.buttons]).dispatch(events)
         return self.selected
 
 class Select_Screen:
@@ -987,7 +1137,7 @@ class Select_Screen:
     Attributes
     ----------
     table_bg: pygame.Surface
-        Render object of the game background (fit to full_screen).
+        Render object of the game background (fit to full_screen), shared through the backgrounds cache.
     logo: pygame.image
         Image object of the UNO logo.
     title: pygame.Obj
@@ -1002,29 +1152,42 @@ class Select_Screen:
         Determines the state of play.
     buttons: list
         Represents the buttons available on the screen.
+    difficulty: str
+        The selected difficulty, "Easy" or "Hard".
+    difficulty_buttons: list
+        The Toggle objects for choosing the difficulty.
+    input: Dispatcher
+        Routes mouse events to the button under the pointer; rebuilt when the play button appears.
 
 
     Methods
     -------
     onplay:
         Sets the play attribute to True, sending the user to the next screen/into a game.
+    ondifficulty:
+        Sets the difficulty and the state of the difficulty buttons.
     onselect:
         Sets state of the buttons using Toggle.toggle method and identifies the selected button.
+    input_targets:
+        Returns the clickable (rect, button) pairs, with the play button once a number is selected.
     draw:
        Draws the logo, title, table_bg and buttons to the screen. Once button clicked, play button is drawn to screen too. 
     update:
-        Calls the update method from the Buttons class for the button in the list of buttons. Also returns 'selected' variable
+        Routes the events to the buttons through the input Dispatcher. Also returns 'selected' variable
         depending on whether the 'play' variable is True.
     """
     def __init__(self):
-        self.table_bg = pygame.transform.smoothscale(pygame.image.load("Assets/Tables/Table_0.png"),screen.get_size())
-        self.logo = pygame.image.load("Assets/UNO_Logo.png")
-        self.title=font.render("Select Number of Players: ","True","black")
+        self.table_bg = backgrounds.get(0,screen.get_size())
+        self.logo = images.get("Assets/UNO_Logo.png")
+        self.title=text_cache.render(font,"Select Number of Players: ",True,"black")
         self.title_rect=self.title.get_rect(center=(screen.get_width()/2,screen.get_height()/2.1))
         self.play_button=Button((screen.get_width()-75,screen.get_height()-50),"Play",lambda : self.onplay())
         self.selected=0
         self.play=False
         self.buttons=[]
+        self.input=Dispatcher()
+        self.difficulty_buttons=[Toggle((90,60),"Easy",lambda : self.ondifficulty("Easy")),Toggle((250,60),"Hard",lambda : self.ondifficulty("Hard"))]
+        self.ondifficulty("Easy")
         x=1
         y=0
         
@@ -1040,28 +1203,35 @@ class Select_Screen:
     def onplay(self):
         self.play=True
     
+    def ondifficulty(self,difficulty):
+        self.difficulty=difficulty
+        for but in self.difficulty_buttons:
+            but.toggle(but.text==difficulty)
+    
     def onselect(self,i):
         for but in self.buttons:
             but.toggle(False)
         self.selected=i
     
+    def input_targets(self):
+        targets=[(button.rect,button) for button in self.buttons+self.difficulty_buttons]
+        if self.selected:
+            targets.append((self.play_button.rect,self.play_button))
+        return targets
+    
     def draw(self,screen):
         screen.blit(self.table_bg,(0,0))
         screen.blit(self.logo,(screen.get_width()/2-self.logo.get_width()/2,screen.get_height()/6))
         screen.blit(self.title,self.title_rect)
         
-        for button in self.buttons:
+        for button in self.buttons+self.difficulty_buttons:
             button.draw(screen)
         if self.selected:
             self.play_button.draw(screen)
             
     
     def update(self,events):
-        
-        for button in self.buttons:
-            button.update(events)
-        if self.selected:
-            self.play_button.update(events)
+        self.input.rebuild(bool(self.selected),self.input_targets).dispatch(events)
         if self.play:
             return self.selected
         return 0
@@ -1078,7 +1248,7 @@ class Win_Screen:
     score: int
         Represents a player's score.
     table_bg: pygame.Surface
-        Render object of the game background (fit to full_screen).
+        Render object of the game background (fit to full_screen), shared through the backgrounds cache.
     con_text: pygame.Obj
         Render object of a congratulatory message.
     player_text: pygame.Obj
@@ -1087,6 +1257,8 @@ class Win_Screen:
         Render object of the score.
     playagain_button: Obj
         A Button object representing 'play again'.
+    input: Dispatcher
+        Routes mouse events to the button under the pointer.
     play: bool
         Determines the state of play.
 
@@ -1102,15 +1274,16 @@ class Win_Screen:
         Then updates the play attribute to be True.
     """
     def __init__(self,player,score) -> None:
-        self.table_bg = pygame.transform.smoothscale(pygame.image.load("Assets/Tables/Table_0.png"),screen.get_size())
-        self.con_text=font.render("Congratulation",True,"black")
+        self.table_bg = backgrounds.get(0,screen.get_size())
+        self.con_text=text_cache.render(font,"Congratulation",True,"black")
         
-        self.player_text=font.render(f"{player} Win",True,"black")
-        self.score_text=font.render(f"Score: {score}",True,"black")
+        self.player_text=text_cache.render(font,f"{player} Win",True,"black")
+        self.score_text=text_cache.render(font,f"Score: {score}",True,"black")
         self.playagain_button=Button((-125+screen.get_width()/2,screen.get_height()/2+250),"Play Again",self.play_again)
         self.playagain_button.rect.width=250
         self.playagain_button.rect.center=(screen.get_width()/2,screen.get_height()/2+250)
         self.playagain_button.text_rect=self.playagain_button.text_surface.get_rect(center=self.playagain_button.rect.center)
+        self.input=Dispatcher()
         self.play=False
 
     def play_again(self):
@@ -1123,7 +1296,7 @@ class Win_Screen:
         self.playagain_button.draw(screen)
     
     def update(self,events):
-        self.playagain_button.update(events)
+        self.input.rebuild(None,[(self.playagain_button.rect,self.playagain_button)]).dispatch(events)
         if self.play:
             return True
         
@@ -1140,6 +1313,10 @@ class Game:
         Displays the given object to the screen (as a scene).
     close_button: Obj
         Button object that can be clicked to close the game.
+    input: Dispatcher
+        Routes the mouse events to the close button, which sits on top of every scene.
+    preloader: Preloader
+        Decodes the images on a thread pool while the start screen is showing.
     isquit: bool
         Determines whether the game has been quit or not. 
 
@@ -1147,29 +1324,65 @@ class Game:
     -------
     exit:
         Sets 'isquit' to True, therefore closing the game.
+    table_size:
+        Returns the seats and decks of a new table, from the menu or UNO_SEATS and UNO_DECKS.
+    busy:
+        Returns whether the next frame has work to do without any input:
+        images still loading, or a table that is busy.
     update:
         Determines which scene should be displayed to the screen,
         as well as checking if any buttons have been pressed which
-        would result in the game closing.
+        would result in the game closing. Scenes draw into the renderer,
+        which only redraws what changed.
     """
     def __init__(self):
         self.state="start_screen"
-        self.selector=Start_Screen()
+        self.preloader=Preloader().start()
+        self.selector=Start_Screen(self.preloader)
         
-        close_icon=pygame.image.load("Assets/UI/close.png")
+        close_icon=images.get("Assets/UI/close.png")
         
         self.close_button=Button((screen.get_width()-130,0),callback=self.exit,image=close_icon)
+        self.input=Dispatcher()
         self.isquit=False
     
     def exit(self):
         print("quit")
         self.isquit=True
     
+    def table_size(self,selected):
+        """
+        Returns the seats and decks of a new table. UNO_SEATS and UNO_DECKS
+        (large tables for the tournament variant: 2-20 seats, 1-4 decks)
+        override the menu selection; invalid values are reported and ignored.
+        """
+        try:
+            seats=int(os.environ.get("UNO_SEATS") or selected)
+            decks=int(os.environ["UNO_DECKS"]) if os.environ.get("UNO_DECKS") else None
+            if not 2<=seats<=MAX_SEATS:
+                raise ValueError(f"UNO_SEATS must be 2 to {MAX_SEATS}, not {seats}")
+            if decks is not None and not decks_needed(seats)<=decks<=MAX_DECKS:
+                raise ValueError(f"UNO_DECKS must be {decks_needed(seats)} to {MAX_DECKS} for {seats} seats, not {decks}")
+        except ValueError as error:
+            print(f"ignoring UNO_SEATS/UNO_DECKS: {error}")
+            return selected,None
+        return seats,decks
+    
+    def busy(self):
+        if not self.preloader.done:
+            return True
+        return self.state=="game" and self.table.busy()
+    
+    @profiler.timed("Game.update")
     def update(self,events,dt):
-        self.close_button.update(events)
+        self.input.rebuild(None,[(self.close_button.rect,self.close_button)]).dispatch(events)
+        if not self.preloader.done:
+            self.preloader.poll()
+            if self.preloader.done:
+                backgrounds.prepare(screen.get_size())
 
         if self.state=="start_screen":
-            self.selector.draw(screen)
+            self.selector.draw(renderer)
             selected=self.selector.update(events)
             if selected==1:
                 self.state="select_screen"
@@ -1178,47 +1391,112 @@ class Game:
                 exit()
         
         if self.state=="select_screen":
-            self.selector.draw(screen)
+            self.selector.draw(renderer)
             selected=self.selector.update(events)
             if selected>1:
                 self.state="game"
-                self.table=Table(selected)
+                self.preloader.finish()
+                seed=os.environ.get("UNO_SEED")
+                selected,decks=self.table_size(selected)
+                remote=None
+                saved=None
+                save_path=os.environ.get("UNO_SAVE")
+                if os.environ.get("UNO_SERVER"):
+                    remote=RemoteClient.connect(os.environ["UNO_SERVER"])
+                    remote.join(selected,self.selector.difficulty,seed=int(seed) if seed else None)
+                    save_path=None
+                elif save_path and os.path.exists(save_path):
+                    try:
+                        saved=load_game(save_path)
+                    except (ValueError,KeyError,TypeError,IndexError,OSError) as error:
+                        # an old or damaged save is replaced by the new table's first save
+                        print(f"not resuming {save_path}: {error!r}")
+                self.table=Table(selected,self.selector.difficulty,int(seed) if seed else None,os.environ.get("UNO_REPLAY_DIR"),remote,saved,save_path,decks)
                 
             
         elif self.state=="game":
-            self.table.draw(screen)
+            self.table.draw(renderer)
             result=self.table.update(events,dt)
             if result:
                 self.winscreen=Win_Screen(result[0],result[1])
                 self.state="won"
         
         elif self.state=="won":
-            self.winscreen.draw(screen)
+            self.winscreen.draw(renderer)
             if self.winscreen.update(events):
                 self.selector.play=False
                 self.state="select_screen"
         
             
-        self.close_button.draw(screen)
+        self.close_button.draw(renderer)
         if self.isquit:
             return True
 
+def next_events(busy):
+    """
+    Returns the events and the frame time (seconds) of the next frame.
+
+    While something is animating this runs at 60 fps. Otherwise nothing can
+    change until the user does something, so it sleeps in pygame.event.wait
+    until an event arrives or IDLE_TIMEOUT ms pass, and reports a frame time
+    of 0 so the idle spell does not count as animation time.
+    """
+    if busy:
+        events=pygame.event.get()
+        with profiler.section("clock.tick"):
+            clock.tick(60)
+        return events,clock.get_time()/1000
+    with profiler.section("event.wait"):
+        event=pygame.event.wait(IDLE_TIMEOUT)
+    events=pygame.event.get()
+    if event.type!=pygame.NOEVENT:
+        events.insert(0,event)
+    clock.tick()
+    return events,0
+
 # the main game loop
 def main():
     
     gameover=False
     game=Game()
+    # UNO_RECORD=game.unorec records the table to a file on a background thread
+    record_path=os.environ.get("UNO_RECORD")
+    recorder=None
+    if record_path:
+        from recorder import Recorder # needs NumPy, so only imported when recording
+        recorder=Recorder(record_path,screen.get_size()).start()
     while not gameover:
-        events=pygame.event.get()
-        clock.tick(60)
-        delta=clock.get_time()/1000
+        events,delta=next_events(game.busy())
         for event in events:
             if event.type == pygame.QUIT:
                 gameover=True
+            elif event.type in (pygame.VIDEOEXPOSE,pygame.WINDOWEXPOSED):
+                renderer.invalidate()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle()
         if game.update(events,delta):
             gameover= not gameover
         
-        pygame.display.update()
+        profiler.draw(renderer,profile_font)
+        with profiler.section("Renderer.present"):
+            dirty=renderer.present()
+        with profiler.section("display.update"):
+            if dirty:
+                pygame.display.update(dirty)
+        if recorder:
+            with profiler.section("Recorder.capture"):
+                if game.state=="game":
+                    recorder.capture(screen,dirty)
+                else:
+                    recorder.gap()
+        profiler.end_frame()
+    
+    if recorder:
+        recorder.close()
+        print(recorder.summary())
+    csv_path=os.environ.get("UNO_PROFILE_CSV")
+    if csv_path:
+        profiler.dump_csv(csv_path)
     
 
 if __name__ == "__main__":
@@ -0,0 +1,216 @@
+import csv
+import time
+from array import array
+
+
+class RingBuffer:
+    """
+    A class to represent a fixed-size ring buffer of float samples.
+
+    Attributes
+    ----------
+    samples: array
+        The storage, allocated once.
+    index: int
+        The slot the next sample is written to.
+    count: int
+        The number of valid samples (at most the size of the buffer).
+
+    Methods
+    -------
+    add:
+        Stores a sample, overwriting the oldest one when the buffer is full.
+    values:
+        Returns the stored samples, oldest first.
+    percentile:
+        Returns the p-th percentile (0-100) of the stored samples.
+    """
+    def __init__(self, size):
+        self.samples = array("d", bytes(8*size))
+        self.index = 0
+        self.count = 0
+
+    def add(self, value):
+        self.samples[self.index] = value
+        self.index = (self.index + 1) % len(self.samples)
+        if self.count < len(self.samples):
+            self.count += 1
+
+    def values(self):
+        if self.count < len(self.samples):
+            return list(self.samples[:self.count])
+        return list(self.samples[self.index:]) + list(self.samples[:self.index])
+
+    def percentile(self, p, ordered=None):
+        ordered = ordered or sorted(self.values())
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered)-1, int(round(p/100*(len(ordered)-1))))]
+
+
+class Section:
+    """A reusable context manager that adds its elapsed time to a profiler section."""
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    """
+    A class to represent a per-subsystem frame-time profiler.
+
+    Time spent in each named section is summed over a frame; end_frame()
+    pushes the totals into one fixed-size RingBuffer per section, so memory
+    use does not grow however long the game runs. The last frames can be
+    summarised as p50/p95/p99, drawn as an overlay or dumped to CSV.
+
+    Attributes
+    ----------
+    size: int
+        The number of frames kept per section.
+    enabled: bool
+        Whether sections are being timed.
+    visible: bool
+        Whether the overlay is drawn.
+    history: dict
+        Maps a section name to its RingBuffer of per-frame totals (seconds).
+    frame: dict
+        Maps a section name to the time spent in it during the current frame.
+    sections: dict
+        Maps a section name to its reusable Section context manager.
+    frame_start: float
+        When the current frame started.
+    frames: int
+        The number of frames recorded.
+    overlay: list
+        The rendered overlay lines, refreshed every refresh frames.
+    refresh: int
+        How many frames the overlay text is kept before it is rendered again.
+
+    Methods
+    -------
+    section:
+        Returns a context manager timing the code inside it.
+    timed:
+        Decorator timing every call of a function.
+    record:
+        Adds a duration to a section for the current frame.
+    end_frame:
+        Closes the current frame and stores its totals.
+    summary:
+        Returns count, mean, p50, p95, p99 and max (ms) for every section.
+    toggle:
+        Shows or hides the overlay.
+    draw:
+        Draws the overlay.
+    dump_csv:
+        Writes the summary to a CSV file.
+    """
+    def __init__(self, size=600, refresh=15):
+        self.size = size
+        self.enabled = True
+        self.visible = False
+        self.history = {}
+        self.frame = {}
+        self.sections = {}
+        self.frame_start = time.perf_counter()
+        self.frames = 0
+        self.overlay = []
+        self.refresh = refresh
+
+    def section(self, name):
+        section = self.sections.get(name)
+        if section is None:
+            section = self.sections[name] = Section(self, name)
+        return section
+
+    def timed(self, name):
+        def decorator(function):
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            wrapper.__name__ = function.__name__
+            wrapper.__doc__ = function.__doc__
+            return wrapper
+        return decorator
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        self.frame[name] = self.frame.get(name, 0.0) + seconds
+
+    def end_frame(self):
+        now = time.perf_counter()
+        if self.enabled:
+            self.frame["frame"] = now - self.frame_start
+            for name in self.history.keys() - self.frame.keys():
+                self.history[name].add(0.0)
+            for name, seconds in self.frame.items():
+                history = self.history.get(name)
+                if history is None:
+                    history = self.history[name] = RingBuffer(self.size)
+                history.add(seconds)
+            self.frames += 1
+        self.frame.clear()
+        self.frame_start = now
+
+    def summary(self):
+        rows = []
+        for name in sorted(self.history):
+            history = self.history[name]
+            ordered = sorted(history.values())
+            if not ordered:
+                continue
+            rows.append({
+                "section": name,
+                "frames": len(ordered),
+                "mean_ms": sum(ordered)/len(ordered)*1000,
+                "p50_ms": history.percentile(50, ordered)*1000,
+                "p95_ms": history.percentile(95, ordered)*1000,
+                "p99_ms": history.percentile(99, ordered)*1000,
+                "max_ms": ordered[-1]*1000,
+            })
+        return rows
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.overlay = []
+
+    def draw(self, screen, font):
+        if not self.visible:
+            return
+        if not self.overlay or self.frames % self.refresh == 0:
+            lines = [f"{'section':<16}{'p50':>8}{'p95':>8}{'p99':>8}  ms"]
+            for row in self.summary():
+                lines.append(f"{row['section']:<16}{row['p50_ms']:>8.2f}{row['p95_ms']:>8.2f}{row['p99_ms']:>8.2f}")
+            self.overlay = [font.render(line, True, "white", "black") for line in lines]
+        y = 10
+        for line in self.overlay:
+            screen.blit(line, (10, y))
+            y += line.get_height()
+
+    def dump_csv(self, path):
+        fields = ["section", "frames", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=fields)
+            writer.writeheader()
+            for row in self.summary():
+                writer.writerow({key: round(value, 4) if isinstance(value, float) else value for key, value in row.items()})
+
+
+profiler = Profiler()
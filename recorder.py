@@ -0,0 +1,331 @@
+"""
+Off-thread recording of the game screen.
+
+    UNO_RECORD=game.unorec python main.py        # record while playing
+    python recorder.py game.unorec                # frames, length, size
+    python recorder.py game.unorec --export out   # one PNG per frame
+
+The game loop hands the screen to Recorder.capture after each frame has
+been presented. capture only copies the pixels of the regions the renderer
+redrew (frames where nothing changed cost nothing) and puts them on a
+bounded queue; it never waits. An encoder thread takes frames off the queue,
+XORs every region with what was there in the previous frame, so pixels that
+did not change become zero bytes, and compresses the result with zlib. The
+XOR runs in NumPy and zlib works on the buffers directly; both release the
+GIL on large buffers, so the encoder does not take time from the game thread.
+
+If the encoder falls behind and the queue is full, the frame is left out of
+the recording instead of holding up the game, and the next frame that is
+queued also covers the regions the dropped ones changed, so the recording
+stays consistent. A whole frame (a key frame) is written first, after a gap
+in the frames offered and every keyframe_interval frames, so a recording
+can be read from the nearest key frame onwards.
+
+A recording is the magic line, a JSON header line and one record per frame:
+
+    FRAME   index, timestamp (seconds), kind (KEY or DELTA), region count
+    REGION  x, y, width, height, compressed length, then the zlib data
+
+The rows of a region are RGBX (the fourth byte unused), top to bottom. Frames where nothing changed
+are not written, and the timestamps give the time to show each frame at on
+playback. Frame indices count every changed frame, so gaps show the frames
+that were dropped.
+"""
+import argparse
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+import pygame
+
+MAGIC = b"UNOREC 1\n"
+KEY = 0
+DELTA = 1
+FRAME = struct.Struct("<IdBH")
+REGION = struct.Struct("<HHHHI")
+# the layout of the display surface, so capturing a region is a plain copy
+FORMAT = "RGBX"
+BYTES_PER_PIXEL = len(FORMAT)
+tobytes = getattr(pygame.image, "tobytes", None) or pygame.image.tostring
+frombytes = getattr(pygame.image, "frombytes", None) or pygame.image.fromstring
+
+
+class Canvas:
+    """
+    A class to represent the last frame of a recording.
+
+    Attributes
+    ----------
+    pixels: numpy.ndarray
+        The frame as a height x width x 4 array of RGBX bytes.
+
+    Methods
+    -------
+    region:
+        Returns the view of a rectangle of the frame.
+    delta:
+        Writes a region's new bytes into the frame and returns their XOR with the old ones.
+    undo_delta:
+        Applies a region returned by delta to the frame.
+    paste:
+        Writes a region's bytes into the frame.
+    """
+    def __init__(self, width, height):
+        self.pixels = np.zeros((height, width, BYTES_PER_PIXEL), np.uint8)
+
+    def region(self, rect):
+        x, y, width, height = rect
+        return self.pixels[y:y + height, x:x + width]
+
+    def delta(self, rect, data):
+        region = self.region(rect)
+        new = np.frombuffer(data, np.uint8).reshape(region.shape)
+        xored = np.bitwise_xor(new, region)
+        region[...] = new
+        return xored
+
+    def undo_delta(self, rect, data):
+        region = self.region(rect)
+        region ^= np.frombuffer(data, np.uint8).reshape(region.shape)
+        return region
+
+    def paste(self, rect, data):
+        region = self.region(rect)
+        region[...] = np.frombuffer(data, np.uint8).reshape(region.shape)
+
+
+class Recorder:
+    """
+    A class to represent a recording being written by a background thread.
+
+    Attributes
+    ----------
+    path: str
+        The file the recording is written to.
+    size: tuple(int, int)
+        The width and height of the recorded screen.
+    queue: queue.Queue
+        The captured frames waiting to be encoded, at most queue_size of them.
+    keyframe_interval: int
+        The number of frames between two whole frames.
+    level: int
+        The zlib compression level.
+    frames: int
+        The number of changed frames offered to capture.
+    captured: int
+        The number of frames queued.
+    dropped: int
+        The number of frames left out because the queue was full.
+    encoded: int
+        The number of frames written.
+    raw_bytes: int
+        The size of the captured pixels.
+    written_bytes: int
+        The size of the compressed regions.
+    error: Exception
+        What stopped the encoder thread, or None.
+
+    Methods
+    -------
+    start:
+        Opens the file and starts the encoder thread.
+    capture:
+        Queues the changed regions of a surface without waiting.
+    gap:
+        Makes the next captured frame a whole one, after frames that were not recorded.
+    close:
+        Waits for the queued frames to be written and closes the file.
+    summary:
+        Returns a one-line description of the recording.
+    """
+    def __init__(self, path, size, queue_size=60, keyframe_interval=300, level=1):
+        self.path = path
+        self.size = tuple(size)
+        self.queue = queue.Queue(queue_size)
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        self.thread = None
+        self.canvas = Canvas(*self.size)
+        self.whole = True
+        self.missed = None
+        self.since_key = 0
+        self.frames = 0
+        self.captured = 0
+        self.dropped = 0
+        self.encoded = 0
+        self.raw_bytes = 0
+        self.written_bytes = 0
+        self.error = None
+        self.started = None
+
+    def start(self):
+        self.file = open(self.path, "wb")
+        self.file.write(MAGIC)
+        header = {"width": self.size[0], "height": self.size[1], "format": FORMAT, "keyframe_interval": self.keyframe_interval}
+        self.file.write(json.dumps(header).encode() + b"\n")
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self.encode, name="recorder", daemon=True)
+        self.thread.start()
+        return self
+
+    @property
+    def recording(self):
+        return self.thread is not None and self.error is None
+
+    def capture(self, surface, dirty=None, timestamp=None):
+        """
+        Queues the regions of surface listed in dirty (None means all of it)
+        and returns whether the frame was queued.
+
+        Runs on the game thread: it copies pixels and never blocks.
+        """
+        if not self.recording:
+            return False
+        if dirty is not None and not dirty and not self.whole and self.missed is None:
+            return False
+        index = self.frames
+        self.frames += 1
+        if self.whole or self.since_key >= self.keyframe_interval:
+            kind, rects = KEY, [surface.get_rect()]
+        else:
+            kind, rects = DELTA, list(dirty) if dirty is not None else [surface.get_rect()]
+            if self.missed is not None:
+                rects.append(self.missed)
+        if self.queue.full():
+            # the encoder is behind: skip the copy, and have the next frame
+            # cover what changed in this one as well
+            self.dropped += 1
+            if kind == DELTA:
+                self.missed = rects[0].unionall(rects[1:])
+            return False
+        if timestamp is None:
+            timestamp = time.perf_counter() - self.started
+        regions = [((rect.x, rect.y, rect.width, rect.height), tobytes(surface.subsurface(rect), FORMAT)) for rect in rects]
+        # the game thread is the only producer, so the queue still has room
+        self.queue.put_nowait((index, timestamp, kind, regions))
+        self.captured += 1
+        self.whole = False
+        self.missed = None
+        self.since_key = 0 if kind == KEY else self.since_key + 1
+        return True
+
+    def gap(self):
+        self.whole = True
+
+    def encode(self):
+        out = self.file
+        canvas = self.canvas
+        try:
+            while True:
+                frame = self.queue.get()
+                if frame is None:
+                    break
+                index, timestamp, kind, regions = frame
+                out.write(FRAME.pack(index, timestamp, kind, len(regions)))
+                for rect, data in regions:
+                    # a KEY frame is stored as it is, a DELTA region as the XOR with the frame before
+                    if kind == KEY:
+                        canvas.paste(rect, data)
+                        payload = data
+                    else:
+                        payload = canvas.delta(rect, data)
+                    packed = zlib.compress(payload, self.level)
+                    out.write(REGION.pack(*rect, len(packed)))
+                    out.write(packed)
+                    self.raw_bytes += len(data)
+                    self.written_bytes += len(packed)
+                self.encoded += 1
+        except Exception as error:
+            self.error = error
+        finally:
+            out.close()
+
+    def close(self):
+        if self.thread is None:
+            return
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.thread = None
+
+    def summary(self):
+        text = f"recorded {self.encoded} frames to {self.path} ({self.written_bytes/1e6:.1f} MB"
+        if self.written_bytes:
+            text += f", {self.raw_bytes/self.written_bytes:.0f}x smaller than raw"
+        text += f"), {self.dropped} dropped"
+        if self.error is not None:
+            text += f", stopped by {self.error!r}"
+        return text
+
+
+def read_frames(path):
+    """
+    Yields (index, timestamp, pixels) for every frame of a recording, pixels
+    being the whole frame as RGBX bytes. A recording cut short by a crash is
+    read up to its last complete frame.
+    """
+    with open(path, "rb") as recording:
+        if recording.readline() != MAGIC:
+            raise ValueError(f"{path} is not a recording")
+        header = json.loads(recording.readline())
+        canvas = Canvas(header["width"], header["height"])
+        while True:
+            head = recording.read(FRAME.size)
+            if len(head) < FRAME.size:
+                return
+            index, timestamp, kind, count = FRAME.unpack(head)
+            for i in range(count):
+                head = recording.read(REGION.size)
+                if len(head) < REGION.size:
+                    return
+                x, y, width, height, length = REGION.unpack(head)
+                packed = recording.read(length)
+                if len(packed) < length:
+                    return
+                data = zlib.decompress(packed)
+                if kind == DELTA:
+                    canvas.undo_delta((x, y, width, height), data)
+                else:
+                    canvas.paste((x, y, width, height), data)
+            yield index, timestamp, canvas.pixels.tobytes()
+
+
+def read_header(path):
+    with open(path, "rb") as recording:
+        if recording.readline() != MAGIC:
+            raise ValueError(f"{path} is not a recording")
+        return json.loads(recording.readline())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or export a recording made with UNO_RECORD.")
+    parser.add_argument("recording", help="the .unorec file")
+    parser.add_argument("--export", metavar="DIR", help="write every frame to DIR as frame-<index>.png")
+    args = parser.parse_args()
+
+    header = read_header(args.recording)
+    size = header["width"], header["height"]
+    if args.export:
+        os.makedirs(args.export, exist_ok=True)
+    frames = 0
+    first = last = None
+    last_index = -1
+    for index, timestamp, pixels in read_frames(args.recording):
+        frames += 1
+        first = timestamp if first is None else first
+        last = timestamp
+        last_index = index
+        if args.export:
+            pygame.image.save(frombytes(pixels, size, FORMAT), os.path.join(args.export, f"frame-{index:06d}.png"))
+    length = last - first if frames else 0
+    print(f"{args.recording}: {size[0]}x{size[1]}, {frames} frames over {length:.1f}s, "
+          f"{last_index + 1 - frames} dropped, {os.path.getsize(args.recording)/1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import pygame
+from collections import Counter
+
+
+class Renderer:
+    """
+    A class to represent a dirty-rectangle renderer for the screen.
+
+    Scenes draw into the Renderer exactly as they would into the screen
+    Surface (blit, get_width, get_height, ...). Instead of drawing straight
+    away it records the frame's draw calls. present() compares them with the
+    previous frame, redraws only the regions whose draw calls changed and
+    returns those regions so they can be passed to pygame.display.update.
+    Frames where nothing moved cost no blits and no display update at all.
+
+    Draw calls are compared by the identity of the surface, its position and
+    its area, so surfaces must not be modified in place once they have been
+    drawn; build a new surface instead.
+
+    Attributes
+    ----------
+    screen: pygame.Surface
+        The display surface frames are drawn to.
+    ops: list
+        The draw calls recorded for the frame being built.
+    previous: list
+        The draw calls of the last presented frame.
+    max_rects: int
+        Above this many dirty regions they are merged into one.
+    full: bool
+        Whether the next present() must redraw the whole screen.
+
+    Methods
+    -------
+    blit:
+        Records a surface blit.
+    rect:
+        Records a pygame.draw.rect call.
+    invalidate:
+        Forces the next present() to redraw the whole screen.
+    present:
+        Redraws the changed regions and returns them.
+    """
+    def __init__(self, screen, max_rects=16):
+        self.screen = screen
+        self.ops = []
+        self.previous = []
+        self.max_rects = max_rects
+        self.full = True
+
+    def get_width(self):
+        return self.screen.get_width()
+
+    def get_height(self):
+        return self.screen.get_height()
+
+    def get_size(self):
+        return self.screen.get_size()
+
+    def get_rect(self, **kwargs):
+        return self.screen.get_rect(**kwargs)
+
+    def blit(self, source, dest, area=None, special_flags=0):
+        if isinstance(dest, pygame.Rect):
+            x, y = dest.topleft
+        else:
+            x, y = int(dest[0]), int(dest[1])
+        if area is not None:
+            area = pygame.Rect(area)
+            size = area.size
+            area_key = tuple(area)
+        else:
+            size = source.get_size()
+            area_key = None
+        rect = pygame.Rect(x, y, *size)
+        self.ops.append((("blit", id(source), x, y, area_key, special_flags), rect, (source, (x, y), area, special_flags)))
+        return rect
+
+    def rect(self, color, rect, width=0):
+        rect = pygame.Rect(rect)
+        self.ops.append((("rect", str(color), tuple(rect), width), rect.copy(), (color, rect, width)))
+        return rect
+
+    def invalidate(self):
+        self.full = True
+
+    def dirty_rects(self):
+        keys = [op[0] for op in self.ops]
+        previous_keys = [op[0] for op in self.previous]
+        if keys == previous_keys:
+            return []
+        new, old = Counter(keys), Counter(previous_keys)
+        added, removed = new - old, old - new
+        if not added and not removed:
+            # same draw calls in a different z-order
+            return [op[1] for op, before in zip(self.ops, self.previous) if op[0] != before[0]]
+        return [op[1] for op in self.ops if op[0] in added] + [op[1] for op in self.previous if op[0] in removed]
+
+    def merge(self, rects):
+        bounds = self.screen.get_rect()
+        rects = [rect.clip(bounds) for rect in rects]
+        rects = [rect for rect in rects if rect.width and rect.height]
+        merged = []
+        for rect in rects:
+            i = rect.collidelist(merged)
+            while i != -1:
+                rect = rect.union(merged.pop(i))
+                i = rect.collidelist(merged)
+            merged.append(rect)
+        if len(merged) > self.max_rects:
+            merged = [merged[0].unionall(merged[1:])]
+        return merged
+
+    def present(self):
+        if self.full:
+            dirty = [self.screen.get_rect()]
+            self.full = False
+        else:
+            dirty = self.merge(self.dirty_rects())
+        for region in dirty:
+            self.screen.set_clip(region)
+            for key, rect, args in self.ops:
+                if rect.colliderect(region):
+                    if key[0] == "blit":
+                        self.screen.blit(*args)
+                    else:
+                        pygame.draw.rect(self.screen, args[0], args[1], width=args[2])
+        self.screen.set_clip(None)
+        self.previous = self.ops
+        self.ops = []
+        return dirty
+
+
+def draw_rect(surface, color, rect, width=0):
+    """Draws a rectangle outline on a Surface, or records it on a Renderer."""
+    if isinstance(surface, Renderer):
+        surface.rect(color, rect, width)
+    else:
+        pygame.draw.rect(surface, color, rect, width=width)
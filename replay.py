@@ -0,0 +1,207 @@
+"""
+Append-only replay logs and a headless replayer.
+
+A game is fully determined by its seed, the seat names and the actions
+applied to it, so that is all a log holds. Logs are JSON lines:
+
+    {"version":1,"seed":3141,"players":["You","Max"],"hand_size":7,"decks":1}
+    ["d",17]
+    ["r"]
+    ["p",104,"Red"]
+    ...
+    {"winner":1,"steps":152,"digest":"9f0c..."}
+
+The first line is the header and every other list is one action: its kind as
+a single letter (see CODES), then its card id and colour when it has them.
+The closing record is written when the game is won; its digest hashes the
+final state so a replay can check that it ended byte-for-byte in the same
+place. Lines are flushed as they are written, so the log of a game that
+crashed is complete up to the crash.
+
+    python replay.py logs/*.jsonl                       # replay and verify
+    python replay.py --record logs --games 100 --seed 1 # write bot games
+
+The game writes a log per table when UNO_REPLAY_DIR is set, and UNO_SEED
+fixes the seed of the next table.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+from engine import Action, Engine, RandomBot, COLOR, DISPOSE, DRAW, PASS, PLAY, SHOUT
+
+VERSION = 1
+CODES = {DISPOSE: "d", DRAW: "r", PLAY: "p", COLOR: "c", SHOUT: "s", PASS: "x"}
+KINDS = {code: kind for kind, code in CODES.items()}
+
+
+class ReplayError(Exception):
+    """Raised when a log does not replay to the state it recorded."""
+
+
+def encode(action):
+    fields = [CODES[action.kind]]
+    if action.card is not None:
+        fields.append(action.card)
+    elif action.color is not None:
+        fields.append(None)
+    if action.color is not None:
+        fields.append(action.color)
+    return fields
+
+
+def decode(fields):
+    return Action(KINDS[fields[0]], *fields[1:])
+
+
+def digest(engine):
+    """Returns a hash of everything that decides how a game continues."""
+    state = [list(engine.deck), list(engine.discard_deck), engine.turn_index, engine.direction,
+             engine.color_state, engine.winner]
+    for player in engine.players:
+        state.append([player.cards.mask, player.disposed, player.picked, player.new_picked,
+                      player.to_pick, player.shouted, player.pickingcolor])
+    return hashlib.sha256(json.dumps(state).encode()).hexdigest()
+
+
+class ReplayLog:
+    """
+    A class to represent the replay log of one game.
+
+    Attaching a ReplayLog to an Engine makes Engine.step record every action
+    it applies.
+
+    Attributes
+    ----------
+    path: str
+        The file the log is written to.
+    engine: Engine
+        The game being recorded.
+    file: file
+        The open, line-buffered log file.
+    ended: bool
+        Whether the closing record has been written.
+
+    Methods
+    -------
+    record:
+        Appends an applied action, and the closing record once the game is won.
+    close:
+        Closes the file.
+    """
+    def __init__(self, path, engine):
+        self.path = path
+        self.engine = engine
+        self.ended = False
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.file = open(path, "w", buffering=1)
+        self.write({"version": VERSION, "seed": engine.seed,
+                    "players": [player.name for player in engine.players], "hand_size": engine.hand_size,
+                    "decks": engine.decks})
+        engine.log = self
+
+    def write(self, record):
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def record(self, action):
+        self.write(encode(action))
+        if self.engine.winner is not None and not self.ended:
+            self.write({"winner": self.engine.winner, "steps": self.engine.steps, "digest": digest(self.engine)})
+            self.ended = True
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+        if self.engine.log is self:
+            self.engine.log = None
+
+
+def load(path):
+    """Returns the header, the list of actions and the closing record (or None) of a log."""
+    header, end, actions = None, None, []
+    with open(path) as file:
+        for line in file:
+            record = json.loads(line)
+            if isinstance(record, list):
+                actions.append(decode(record))
+            elif header is None:
+                header = record
+            else:
+                end = record
+    if header is None or header.get("version") != VERSION:
+        raise ReplayError(f"{path} is not a version {VERSION} replay log")
+    return header, actions, end
+
+
+def replay(path, verify=True):
+    """
+    Replays a log and returns the resulting Engine.
+
+    With verify, raises ReplayError unless the game ends with the winner,
+    step count and state digest the log recorded.
+    """
+    header, actions, end = load(path)
+    engine = Engine(header["players"], header["hand_size"], seed=header["seed"], decks=header.get("decks", 1))
+    for action in actions:
+        engine.step(action)
+    if verify and end is not None:
+        found = {"winner": engine.winner, "steps": engine.steps, "digest": digest(engine)}
+        if found != end:
+            raise ReplayError(f"{path} replayed to {found}, expected {end}")
+    return engine
+
+
+def record_games(folder, games, players, seed=0):
+    """Plays games games between RandomBots and writes one log each to folder."""
+    names = [f"Bot{i+1}" for i in range(players)]
+    paths = []
+    for i in range(games):
+        engine = Engine(names, seed=seed + i)
+        path = os.path.join(folder, f"uno-{engine.seed}.jsonl")
+        log = ReplayLog(path, engine)
+        bot = RandomBot(random.Random(engine.seed + 1))
+        while engine.winner is None:
+            engine.step(bot.choose(engine))
+        log.close()
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay and verify UNO replay logs, or record new ones.")
+    parser.add_argument("logs", nargs="*", help="log files (or globs) to replay")
+    parser.add_argument("--record", metavar="FOLDER", help="record bot games into FOLDER instead")
+    parser.add_argument("--games", type=int, default=100, help="games to record")
+    parser.add_argument("--players", type=int, default=4, help="seats per recorded game")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first recorded game")
+    args = parser.parse_args()
+
+    if args.record:
+        paths = record_games(args.record, args.games, args.players, args.seed)
+        print(f"recorded {len(paths)} games in {args.record}")
+        return
+    paths = [path for pattern in args.logs for path in sorted(glob.glob(pattern)) or [pattern]]
+    failed = 0
+    steps = 0
+    start = time.perf_counter()
+    for path in paths:
+        try:
+            steps += replay(path).steps
+        except (ReplayError, ValueError) as error:
+            failed += 1
+            print(f"FAIL {path}: {error}")
+    elapsed = time.perf_counter() - start
+    print(f"replayed {len(paths)} logs, {steps} actions in {elapsed:.2f}s ({steps/(elapsed or 1):.0f} actions/sec), {failed} failed")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,620 @@
+"""
+Asyncio game server hosting many tables.
+
+Every lobby is one authoritative Engine. Clients join a lobby, the remaining
+seats are filled with computer players that run in the server process, and
+the game starts once every human seat is taken. From then on the server
+validates each action against its Engine and broadcasts every applied action
+in order. Clients keep a replica of the game: the start message carries the
+seed, so applying the broadcast actions to Engine(players, seed=seed)
+reproduces the server's state exactly (the same property replay.py relies
+on). This makes every hand derivable by a client, which is fine for friendly
+games on a trusted network but not for play against strangers.
+
+Messages are JSON objects, one per line over TCP or one per text frame over
+WebSocket (a connection that starts with an HTTP GET is upgraded).
+Actions use the compact lists of replay.py:
+
+    -> {"op":"join","players":4,"humans":1,"difficulty":"Easy","name":"You","lobby":null}
+    <- {"op":"start","lobby":"t1","seat":0,"seed":1234,"players":["You","Max",...],"hand_size":7}
+    -> {"op":"act","action":["d",17]}
+    <- {"op":"action","seq":1,"seat":0,"action":["d",17]}
+    <- {"op":"end","winner":2,"player_won":"Max","score":87}
+    -> {"op":"ping","t":...}            <- {"op":"pong","t":...}
+    -> {"op":"stats"}                   <- {"op":"stats",...}
+
+Without a lobby name every join gets a table of its own; joins naming the
+same lobby share it. A human who disconnects is replaced by a computer so the
+rest of the table can finish.
+
+Each table keeps the time between receiving an action and broadcasting it in
+a RingBuffer, so the server can report p50/p95/p99 latency per table.
+
+    python server.py --port 8765                      # serve on localhost
+    python server.py --loopback --tables 2000         # in-process load test
+
+The loopback mode connects scripted clients through in-memory queues instead
+of sockets, so it needs no network at all, and reports throughput, client
+round-trip times and the worst per-table p99.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import random
+import struct
+import time
+
+from engine import COMPUTER_NAMES, Engine, RandomBot
+from ismcts import ISMCTSBot
+from profiler import RingBuffer
+from replay import decode, encode
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_BUFFER = 1 << 20
+# the longest message a client may send: a JSON line, or the payload of a WebSocket message
+MAX_MESSAGE = 1 << 16
+
+
+def percentiles(values):
+    """Returns the p50, p95 and p99 of a list of durations, in milliseconds."""
+    ordered = sorted(values)
+    if not ordered:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    return {f"p{p}_ms": round(ordered[min(len(ordered)-1, int(round(p/100*(len(ordered)-1))))]*1000, 3)
+            for p in (50, 95, 99)}
+
+
+class Connection:
+    """
+    A class to represent one client connection, whatever carries it.
+
+    Attributes
+    ----------
+    lobby: Lobby
+        The lobby the client joined, or None.
+    seat: int
+        The client's seat in that lobby.
+    closed: bool
+        Whether the connection has been closed.
+
+    Methods
+    -------
+    send:
+        Sends a message (a dict).
+    receive:
+        Waits for the next message, or returns None once the peer has gone.
+    send_text:
+        Sends one serialised message.
+    receive_text:
+        Waits for the next serialised message.
+    close:
+        Closes the connection.
+    """
+    def __init__(self):
+        self.lobby = None
+        self.seat = None
+        self.closed = False
+
+    def send(self, message):
+        self.send_text(json.dumps(message, separators=(",", ":")))
+
+    async def receive(self):
+        text = await self.receive_text()
+        return None if text is None else json.loads(text)
+
+    def close(self):
+        self.closed = True
+
+
+class StreamConnection(Connection):
+    """A class to represent a JSON-lines connection over an asyncio stream."""
+    def __init__(self, reader, writer, first=b""):
+        super().__init__()
+        self.reader = reader
+        self.writer = writer
+        self.first = first
+
+    def send_text(self, text):
+        if self.closed:
+            return
+        self.writer.write(text.encode() + b"\n")
+        if self.writer.transport.get_write_buffer_size() > MAX_BUFFER:
+            # the client stopped reading; dropping it is better than buffering forever
+            self.close()
+
+    async def receive_text(self):
+        line, self.first = self.first or await self.reader.readline(), b""
+        return line.decode() if line else None
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            self.writer.close()
+
+
+class WebSocketConnection(StreamConnection):
+    """
+    A class to represent a WebSocket connection carrying one message per text frame.
+
+    Only what browsers send is supported: masked client frames, text,
+    continuation, ping and close.
+    """
+    @classmethod
+    async def upgrade(cls, reader, writer, request_line):
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key")
+        if not key:
+            writer.write(b"HTTP/1.1 400 Bad Request\r\n\r\n")
+            writer.close()
+            return None
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        return cls(reader, writer)
+
+    def frame(self, opcode, payload):
+        if len(payload) < 126:
+            header = struct.pack("!BB", 0x80 | opcode, len(payload))
+        elif len(payload) < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, len(payload))
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, len(payload))
+        return header + payload
+
+    def send_text(self, text):
+        if self.closed:
+            return
+        self.writer.write(self.frame(0x1, text.encode()))
+        if self.writer.transport.get_write_buffer_size() > MAX_BUFFER:
+            self.close()
+
+    async def receive_text(self):
+        message = b""
+        while True:
+            try:
+                first, second = await self.reader.readexactly(2)
+            except asyncio.IncompleteReadError:
+                return None
+            opcode, length = first & 0x0F, second & 0x7F
+            if length == 126:
+                length, = struct.unpack("!H", await self.reader.readexactly(2))
+            elif length == 127:
+                length, = struct.unpack("!Q", await self.reader.readexactly(8))
+            if len(message) + length > MAX_MESSAGE:
+                # close with 1009 (message too big) instead of buffering whatever length was claimed
+                self.writer.write(self.frame(0x8, struct.pack("!H", 1009)))
+                return None
+            mask = await self.reader.readexactly(4) if second & 0x80 else b"\0\0\0\0"
+            payload = await self.reader.readexactly(length)
+            payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+            if opcode == 0x8:
+                return None
+            if opcode == 0x9:
+                self.writer.write(self.frame(0xA, payload))
+                continue
+            if opcode in (0x0, 0x1):
+                message += payload
+                if first & 0x80:
+                    return message.decode()
+
+
+class LoopbackConnection(Connection):
+    """A class to represent one end of an in-memory connection, for tests without a network."""
+    def __init__(self):
+        super().__init__()
+        self.inbox = asyncio.Queue()
+        self.peer = None
+
+    @classmethod
+    def pair(cls):
+        a, b = cls(), cls()
+        a.peer, b.peer = b, a
+        return a, b
+
+    def send_text(self, text):
+        if not self.closed and not self.peer.closed:
+            self.peer.inbox.put_nowait(text)
+
+    async def receive_text(self):
+        return await self.inbox.get()
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            self.peer.inbox.put_nowait(None)
+
+
+class Lobby:
+    """
+    A class to represent one table on the server.
+
+    Attributes
+    ----------
+    name: str
+        The lobby name clients join by.
+    players: int
+        The number of seats.
+    humans: int
+        The number of seats for connected clients; the rest are computers.
+    difficulty: str
+        "Easy" for RandomBot computers, "Hard" for ISMCTSBot ones.
+    seed: int
+        The seed of the game.
+    delay: float
+        Seconds to wait after each computer move.
+    connections: dict
+        Maps a human seat to its Connection.
+    names: list(str)
+        The names of the human seats, in join order.
+    engine: Engine
+        The authoritative game, created when the lobby starts.
+    bots: dict
+        Maps each computer seat to its bot.
+    seq: int
+        The number of actions broadcast.
+    latency: RingBuffer
+        Seconds from receiving a client action to broadcasting it.
+    wake: asyncio.Event
+        Set whenever a client moves, to let the computer seats continue.
+    task: asyncio.Task
+        Plays the computer seats.
+
+    Methods
+    -------
+    join:
+        Seats a connection, and starts the game once every human seat is taken.
+    start:
+        Deals the game and sends every client its start message.
+    act:
+        Applies an action sent by a client.
+    apply:
+        Applies an action to the engine and broadcasts it.
+    leave:
+        Hands the seat of a disconnected client to a computer.
+    run:
+        Plays the computer seats until the game is won.
+    stats:
+        Returns the table's latency percentiles.
+    """
+    def __init__(self, server, name, players, humans=1, difficulty="Easy", seed=None, delay=0.0):
+        self.server = server
+        self.name = name
+        self.players = players
+        self.humans = humans
+        self.difficulty = difficulty
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.delay = delay
+        self.connections = {}
+        self.names = []
+        self.engine = None
+        self.bots = {}
+        self.seq = 0
+        self.latency = RingBuffer(256)
+        self.wake = asyncio.Event()
+        self.task = None
+
+    @property
+    def started(self):
+        return self.engine is not None
+
+    def join(self, connection, name):
+        seat = len(self.names)
+        self.names.append(name)
+        self.connections[seat] = connection
+        connection.lobby, connection.seat = self, seat
+        if len(self.names) == self.humans:
+            self.start()
+
+    def start(self):
+        rng = random.Random(self.seed)
+        computers = list(COMPUTER_NAMES)
+        rng.shuffle(computers)
+        names = self.names + computers[:self.players - self.humans]
+        self.engine = Engine(names, seed=self.seed)
+        for seat in range(self.humans, self.players):
+            self.bots[seat] = ISMCTSBot(rng=rng) if self.difficulty == "Hard" else RandomBot(rng)
+        for seat, connection in self.connections.items():
+            connection.send({"op": "start", "lobby": self.name, "seat": seat, "seed": self.seed,
+                             "players": names, "hand_size": self.engine.hand_size, "decks": self.engine.decks})
+        self.task = asyncio.create_task(self.run())
+
+    def act(self, connection, fields, received):
+        if not self.started or self.engine.winner is not None or connection.seat != self.engine.turn_index:
+            connection.send({"op": "error", "message": "not your turn"})
+            return
+        if not (isinstance(fields, list) and fields and all(field is None or isinstance(field, (str, int)) for field in fields)):
+            connection.send({"op": "error", "message": "an action is a non-empty list of codes, card ids and colours"})
+            return
+        try:
+            self.apply(connection.seat, decode(fields))
+        except (ValueError, KeyError, TypeError, IndexError) as error:
+            connection.send({"op": "error", "message": str(error)})
+            return
+        self.latency.add(time.perf_counter() - received)
+        self.wake.set()
+
+    def apply(self, seat, action):
+        self.engine.step(action)
+        self.seq += 1
+        text = json.dumps({"op": "action", "seq": self.seq, "seat": seat, "action": encode(action)}, separators=(",", ":"))
+        for connection in self.connections.values():
+            connection.send_text(text)
+        self.server.actions += 1
+
+    def leave(self, connection):
+        seat = connection.seat
+        if self.connections.get(seat) is not connection:
+            return
+        del self.connections[seat]
+        if not self.started:
+            # free the seat for somebody else
+            self.names.pop(seat)
+            for other in self.connections.values():
+                if other.seat > seat:
+                    other.seat -= 1
+            self.connections = {other.seat: other for other in self.connections.values()}
+            return
+        self.bots[seat] = RandomBot()
+        text = json.dumps({"op": "left", "seat": seat})
+        for other in self.connections.values():
+            other.send_text(text)
+        self.wake.set()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        engine = self.engine
+        while engine.winner is None:
+            seat = engine.turn_index
+            bot = self.bots.get(seat)
+            if bot is None:
+                self.wake.clear()
+                await self.wake.wait()
+                continue
+            if bot.expensive:
+                action = await loop.run_in_executor(None, bot.choose, engine.clone())
+            else:
+                action = bot.choose(engine)
+            self.apply(seat, action)
+            await asyncio.sleep(self.delay)
+        text = json.dumps({"op": "end", "winner": engine.winner, "player_won": engine.player_won,
+                           "score": engine.calculate_score()})
+        for connection in self.connections.values():
+            connection.send_text(text)
+        self.server.finish(self)
+
+    def stats(self):
+        return {"lobby": self.name, "actions": self.seq, **percentiles(self.latency.values())}
+
+
+class Server:
+    """
+    A class to represent the game server.
+
+    Attributes
+    ----------
+    lobbies: dict
+        Maps a lobby name to every Lobby that has not finished.
+    delay: float
+        Seconds computer seats wait after each move.
+    actions: int
+        The number of actions applied on every table.
+    finished: int
+        The number of games played to the end.
+    latency: RingBuffer
+        Action latencies of recently finished tables.
+    table_p99: RingBuffer
+        The p99 action latency of each recently finished table.
+    ids: itertools.count
+        Numbers the lobbies created without a name.
+
+    Methods
+    -------
+    handle:
+        Serves one connection until it closes.
+    accept:
+        Serves one TCP connection, upgrading it to WebSocket when it asks to.
+    dispatch:
+        Handles one message from a client.
+    finish:
+        Forgets a lobby whose game has ended.
+    stats:
+        Returns server-wide counters and per-table latency.
+    serve:
+        Listens for TCP and WebSocket clients.
+    """
+    def __init__(self, delay=0.0):
+        self.lobbies = {}
+        self.delay = delay
+        self.actions = 0
+        self.finished = 0
+        self.latency = RingBuffer(100000)
+        self.table_p99 = RingBuffer(100000)
+        self.ids = itertools.count(1)
+
+    async def handle(self, connection):
+        try:
+            while True:
+                message = await connection.receive()
+                if message is None:
+                    break
+                self.dispatch(connection, message, time.perf_counter())
+        except (ConnectionError, asyncio.IncompleteReadError, json.JSONDecodeError, UnicodeDecodeError, ValueError):
+            # ValueError: a JSON line longer than MAX_MESSAGE
+            pass
+        finally:
+            if connection.lobby is not None:
+                connection.lobby.leave(connection)
+            connection.close()
+
+    async def accept(self, reader, writer):
+        try:
+            first = await reader.readline()
+            if first.startswith(b"GET "):
+                connection = await WebSocketConnection.upgrade(reader, writer, first)
+            else:
+                connection = StreamConnection(reader, writer, first)
+        except (ConnectionError, ValueError, UnicodeDecodeError):
+            # a request or header line longer than MAX_MESSAGE, or a dropped connection
+            writer.close()
+            return
+        if connection is None:
+            return
+        await self.handle(connection)
+
+    def dispatch(self, connection, message, received):
+        op = message.get("op") if isinstance(message, dict) else None
+        if op == "act" and connection.lobby is not None:
+            connection.lobby.act(connection, message.get("action"), received)
+        elif op == "join" and connection.lobby is None:
+            players = message.get("players", 4)
+            humans = message.get("humans", 1)
+            if not (isinstance(players, int) and isinstance(humans, int) and 1 <= humans <= players and 2 <= players <= len(COMPUTER_NAMES) + 1):
+                connection.send({"op": "error", "message": "bad player count"})
+                return
+            name, seed = message.get("lobby"), message.get("seed")
+            if not (name is None or isinstance(name, str)) or not (seed is None or isinstance(seed, int)):
+                connection.send({"op": "error", "message": "lobby must be a string and seed an integer"})
+                return
+            name = name or f"t{next(self.ids)}"
+            lobby = self.lobbies.get(name)
+            if lobby is not None:
+                if lobby.started:
+                    connection.send({"op": "error", "message": f"lobby {name} is full"})
+                    return
+                lobby.join(connection, str(message.get("name", "Player")))
+                return
+            # list the lobby only once its first player is seated, so a join that fails leaves nothing behind
+            lobby = Lobby(self, name, players, humans, message.get("difficulty", "Easy"), seed, self.delay)
+            lobby.join(connection, str(message.get("name", "Player")))
+            self.lobbies[name] = lobby
+        elif op == "ping":
+            connection.send({"op": "pong", "t": message.get("t")})
+        elif op == "stats":
+            connection.send({"op": "stats", **self.stats()})
+        else:
+            connection.send({"op": "error", "message": f"unexpected {op!r}"})
+
+    def finish(self, lobby):
+        if self.lobbies.get(lobby.name) is lobby:
+            del self.lobbies[lobby.name]
+        self.finished += 1
+        values = lobby.latency.values()
+        for value in values:
+            self.latency.add(value)
+        if values:
+            self.table_p99.add(percentiles(values)["p99_ms"]/1000)
+
+    def stats(self):
+        return {
+            "tables": len(self.lobbies),
+            "finished": self.finished,
+            "actions": self.actions,
+            "latency": percentiles(self.latency.values()),
+            "worst_table_p99_ms": round(max(self.table_p99.values(), default=0.0)*1000, 3),
+            "per_table": [lobby.stats() for lobby in self.lobbies.values() if lobby.started],
+        }
+
+    async def serve(self, host="127.0.0.1", port=8765, interval=0):
+        listener = await asyncio.start_server(self.accept, host, port, limit=MAX_MESSAGE)
+        print(f"serving on {', '.join(str(socket.getsockname()) for socket in listener.sockets)}")
+        async with listener:
+            while True:
+                await asyncio.sleep(interval or 3600)
+                if interval:
+                    stats = self.stats()
+                    print(f"{stats['tables']} tables, {stats['finished']} finished, {stats['actions']} actions, latency {stats['latency']}")
+
+
+async def loopback_client(server, rtts, players, difficulty, lobby=None, humans=1):
+    """
+    Plays one seat through an in-memory connection with a RandomBot.
+
+    Keeps a replica Engine from the broadcast actions, checks that it ends
+    like the server's and adds the round trip of each own action to rtts.
+    """
+    client, end = LoopbackConnection.pair()
+    asyncio.create_task(server.handle(end))
+    client.send({"op": "join", "players": players, "humans": humans, "difficulty": difficulty,
+                 "name": "Loop", "lobby": lobby})
+    start = await client.receive()
+    engine = Engine(start["players"], start["hand_size"], seed=start["seed"])
+    seat = start["seat"]
+    bot = RandomBot(random.Random(start["seed"] + seat))
+    sent = None
+    while True:
+        if engine.winner is None and engine.turn_index == seat and sent is None:
+            client.send({"op": "act", "action": encode(bot.choose(engine))})
+            sent = time.perf_counter()
+        message = await client.receive()
+        if message["op"] == "action":
+            engine.step(decode(message["action"]))
+            if message["seat"] == seat:
+                rtts.append(time.perf_counter() - sent)
+                sent = None
+        elif message["op"] == "end":
+            if message["winner"] != engine.winner:
+                raise RuntimeError(f"replica of {start['lobby']} ended with {engine.winner}, server with {message['winner']}")
+            break
+        elif message["op"] == "error":
+            raise RuntimeError(message["message"])
+    client.close()
+
+
+async def loopback(tables, players, humans=1, difficulty="Easy", delay=0.0):
+    """Plays tables games at once against an in-process Server and returns a report."""
+    server = Server(delay)
+    rtts = []
+    clients = []
+    start = time.perf_counter()
+    for i in range(tables):
+        for j in range(humans):
+            clients.append(loopback_client(server, rtts, players, difficulty, f"loop{i}", humans))
+    await asyncio.gather(*clients)
+    elapsed = time.perf_counter() - start
+    stats = server.stats()
+    return {
+        "tables": tables,
+        "players": players,
+        "humans": humans,
+        "elapsed": round(elapsed, 3),
+        "tables_per_sec": round(tables/elapsed, 1),
+        "actions_per_sec": round(server.actions/elapsed, 1),
+        "round_trip": percentiles(rtts),
+        "server_latency": stats["latency"],
+        "worst_table_p99_ms": stats["worst_table_p99_ms"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host UNO tables over TCP/WebSocket, or load-test the server in-process.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds computer seats wait after each move")
+    parser.add_argument("--stats-interval", type=float, default=0, help="print server stats every this many seconds")
+    parser.add_argument("--loopback", action="store_true", help="run an in-process load test instead of listening")
+    parser.add_argument("--tables", type=int, default=1000, help="tables played at once in loopback mode")
+    parser.add_argument("--players", type=int, default=4, help="seats per loopback table")
+    parser.add_argument("--humans", type=int, default=1, help="scripted clients per loopback table")
+    parser.add_argument("--difficulty", default="Easy", choices=["Easy", "Hard"], help="computer seats of loopback tables")
+    args = parser.parse_args()
+
+    if args.loopback:
+        print(json.dumps(asyncio.run(loopback(args.tables, args.players, args.humans, args.difficulty, args.delay)), indent=2))
+        return
+    try:
+        asyncio.run(Server(args.delay).serve(args.host, args.port, args.stats_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
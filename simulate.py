@@ -0,0 +1,169 @@
+"""
+Batch self-play simulator.
+
+Plays complete games between computer bots on every core of the machine and
+reports throughput and outcome statistics:
+
+    python simulate.py --games 100000 --players 4
+
+Games are split into chunks and each chunk is played by a worker process of a
+ProcessPoolExecutor. Workers only send back aggregated counters, so the cost
+of collecting results does not grow with the number of games.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import play_game
+
+
+class SimulationStats:
+    """
+    A class to represent the aggregated results of many games.
+
+    Attributes
+    ----------
+    players: int
+        The number of seats in every game.
+    games: int
+        The number of finished games.
+    unfinished: int
+        The number of games that hit the step limit without a winner.
+    wins: list(int)
+        The number of games won by each seat.
+    turns: int
+        The total number of turns played.
+    steps: int
+        The total number of engine actions applied.
+    reshuffles: int
+        The total number of times a discard pile was shuffled back into the deck.
+    score: int
+        The total of the winners' scores.
+    elapsed: float
+        The wall-clock time spent playing, in seconds.
+
+    Methods
+    -------
+    add_game:
+        Adds the result of one finished Engine.
+    merge:
+        Adds the counters of another SimulationStats.
+    report:
+        Returns the summary (rates and means) as a dictionary.
+    """
+    def __init__(self, players):
+        self.players = players
+        self.games = 0
+        self.unfinished = 0
+        self.wins = [0]*players
+        self.turns = 0
+        self.steps = 0
+        self.reshuffles = 0
+        self.score = 0
+        self.elapsed = 0.0
+
+    def add_game(self, engine):
+        if engine.winner is None:
+            self.unfinished += 1
+            return
+        self.games += 1
+        self.wins[engine.winner] += 1
+        self.turns += engine.turns
+        self.steps += engine.steps
+        self.reshuffles += engine.reshuffles
+        self.score += engine.calculate_score()
+
+    def merge(self, other):
+        self.games += other.games
+        self.unfinished += other.unfinished
+        self.wins = [a+b for a, b in zip(self.wins, other.wins)]
+        self.turns += other.turns
+        self.steps += other.steps
+        self.reshuffles += other.reshuffles
+        self.score += other.score
+
+    def report(self):
+        games = self.games or 1
+        elapsed = self.elapsed or float("inf")
+        return {
+            "players": self.players,
+            "games": self.games,
+            "unfinished": self.unfinished,
+            "elapsed": round(self.elapsed, 3),
+            "games_per_sec": round(self.games/elapsed, 1),
+            "turns_per_sec": round(self.turns/elapsed, 1),
+            "steps_per_sec": round(self.steps/elapsed, 1),
+            "win_rate": [round(w/games, 4) for w in self.wins],
+            "mean_turns": round(self.turns/games, 2),
+            "mean_steps": round(self.steps/games, 2),
+            "reshuffles": self.reshuffles,
+            "mean_reshuffles": round(self.reshuffles/games, 3),
+            "mean_score": round(self.score/games, 2),
+        }
+
+
+def seat_names(players):
+    return [f"Bot{i+1}" for i in range(players)]
+
+
+def play_chunk(games, players, max_steps=100000):
+    """Plays games games in this process and returns their SimulationStats."""
+    stats = SimulationStats(players)
+    names = seat_names(players)
+    for i in range(games):
+        stats.add_game(play_game(names, max_steps=max_steps))
+    return stats
+
+
+def simulate(games, players, workers=None, chunk=500):
+    """
+    Plays games games between RandomBots split across workers processes.
+
+    Returns the merged SimulationStats. With workers=1 everything runs in the
+    calling process, which is handy for profiling.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = [chunk]*(games//chunk)
+    if games % chunk:
+        chunks.append(games % chunk)
+    total = SimulationStats(players)
+    start = time.perf_counter()
+    if workers == 1:
+        for size in chunks:
+            total.merge(play_chunk(size, players))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for stats in pool.map(play_chunk, chunks, [players]*len(chunks)):
+                total.merge(stats)
+    total.elapsed = time.perf_counter() - start
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many UNO games between computer bots and report throughput.")
+    parser.add_argument("--games", type=int, default=10000, help="number of games to play")
+    parser.add_argument("--players", type=int, default=4, help="seats per game (2-20)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk", type=int, default=500, help="games per task sent to a worker")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = simulate(args.games, args.players, args.workers, args.chunk).report()
+    if args.json:
+        print(json.dumps(report))
+        return
+    print(f"{report['games']} games with {report['players']} players in {report['elapsed']}s")
+    print(f"  games/sec:        {report['games_per_sec']}")
+    print(f"  turns/sec:        {report['turns_per_sec']}")
+    print(f"  mean game length: {report['mean_turns']} turns ({report['mean_steps']} actions)")
+    print(f"  reshuffles:       {report['reshuffles']} ({report['mean_reshuffles']} per game)")
+    for seat, rate in enumerate(report["win_rate"]):
+        print(f"  seat {seat} win rate: {rate:.2%}")
+    if report["unfinished"]:
+        print(f"  unfinished games: {report['unfinished']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Computer decisions off the render thread.
+
+A search bot can take far longer than a frame to choose a move. Instead of
+calling bot.choose inside the 60 fps loop, a Thinker submits it to a worker
+pool as a future on a clone of the Engine, so the table keeps animating, and
+polls the future once per frame. A hard deadline bounds how long a seat can
+hold up the game: past it the future is abandoned and a RandomBot move on the
+live engine is played instead. A running search cannot be stopped, so until an
+abandoned one has finished the seat keeps playing fallback moves rather than
+starting a second search on the same bot.
+
+The default pool is a small ThreadPoolExecutor shared by every seat. The
+work function and its arguments are picklable, so a ProcessPoolExecutor can
+be passed in where starting worker processes is safe (main.py opens its
+window at import time, so the game itself sticks to threads).
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from engine import RandomBot
+
+_pool = None
+
+
+def shared_pool():
+    """Returns the worker pool shared by every Thinker, creating it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="thinker")
+    return _pool
+
+
+def decide(bot, engine):
+    return bot.choose(engine)
+
+
+class Thinker:
+    """
+    A class to represent a bot whose decisions are made by a worker pool.
+
+    Attributes
+    ----------
+    bot: object
+        The bot whose choose method runs on the pool.
+    deadline: float
+        Seconds a decision may take before the fallback move is played.
+    fallback: RandomBot
+        Chooses the move on the live engine when the deadline passes, seeded from the bot's rng.
+    pool: Executor
+        Where decisions run; the shared thread pool unless one is given.
+    future: Future
+        The decision in flight, or None.
+    stale: Future
+        An abandoned decision still running on the pool, or None; no new one is submitted until it ends.
+    step: int
+        The Engine.steps value the decision in flight was asked for.
+    started: float
+        When the decision in flight was submitted.
+    timeouts: int
+        The number of decisions that hit the deadline.
+
+    Methods
+    -------
+    poll:
+        Returns the Action for the current state of an Engine once it is ready, or None while thinking.
+    cancel:
+        Abandons the decision in flight, keeping it as stale if it is already running.
+    elapsed:
+        Returns how long the decision in flight has been running.
+    """
+    def __init__(self, bot, deadline=2.0, fallback=None, pool=None):
+        self.bot = bot
+        self.deadline = deadline
+        # seeded from the bot's own generator, so a missed deadline replays the
+        # same way; it gets its own Random because the search may still be
+        # drawing from the bot's on a worker thread
+        self.fallback = fallback or RandomBot(random.Random(getattr(bot, "rng", random).getrandbits(64)))
+        self.pool = pool
+        self.future = None
+        self.stale = None
+        self.step = None
+        self.started = 0.0
+        self.timeouts = 0
+
+    @property
+    def thinking(self):
+        return self.future is not None
+
+    def poll(self, engine):
+        if self.future is not None and self.step != engine.steps:
+            # the game moved on without us (e.g. the table was reset)
+            self.cancel()
+        if self.stale is not None:
+            if not self.stale.done():
+                # the abandoned search still uses the bot (its rng and counters)
+                return self.fallback.choose(engine)
+            self.stale = None
+        if self.future is None:
+            self.step = engine.steps
+            self.started = time.perf_counter()
+            self.future = (self.pool or shared_pool()).submit(decide, self.bot, engine.clone())
+            return None
+        if self.future.done():
+            future = self.future
+            self.future = None
+            return future.result()
+        if self.elapsed() > self.deadline:
+            self.cancel()
+            self.timeouts += 1
+            return self.fallback.choose(engine)
+        return None
+
+    def cancel(self):
+        if self.future is not None:
+            if not self.future.cancel():
+                self.stale = self.future
+            self.future = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.started if self.future is not None else 0.0
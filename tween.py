@@ -0,0 +1,183 @@
+"""
+Tween scheduler for the card animations.
+
+A tween moves an object's position from where it is to a target over a
+duration, shaped by an easing function. The Scheduler advances every running
+tween in one call per frame, so any number of cards can be in flight at once
+(the four cards of a Wild_Draw leave the deck together, a little apart,
+instead of one after another).
+
+Every object has at most one tween: moving it again starts a new tween from
+wherever it is. time_scale speeds all animation up or slows it down, and
+INSTANT finishes every tween the moment it is added, so a headless or
+fast-forwarded table is never held up by animation. The game reads it from
+UNO_TIME_SCALE ("instant", or a factor such as 4).
+
+Nothing in this module imports pygame; positions only need to support
++, - and * by a float, which pygame.Vector2 does.
+"""
+import math
+import os
+
+INSTANT = math.inf
+
+
+def linear(t):
+    return t
+
+
+def ease_in_quad(t):
+    return t*t
+
+
+def ease_out_quad(t):
+    return t*(2 - t)
+
+
+def ease_in_out_quad(t):
+    return 2*t*t if t < 0.5 else 1 - 2*(1 - t)**2
+
+
+def ease_out_cubic(t):
+    return 1 - (1 - t)**3
+
+
+EASINGS = {easing.__name__: easing for easing in (linear, ease_in_quad, ease_out_quad, ease_in_out_quad, ease_out_cubic)}
+
+
+def parse_time_scale(value):
+    """Returns the time scale for a setting such as "instant", "4" or "0.5"; None and "" mean 1."""
+    if not value:
+        return 1.0
+    if value.lower() == "instant":
+        return INSTANT
+    scale = float(value)
+    if scale <= 0:
+        raise ValueError(f"time scale must be positive or 'instant', got {value!r}")
+    return scale
+
+
+class Tween:
+    """
+    A class to represent one object moving to a position.
+
+    Attributes
+    ----------
+    target: object
+        The object whose position is animated.
+    start: pygame.Vector2
+        The position it started from.
+    end: pygame.Vector2
+        The position it moves to.
+    duration: float
+        The length of the movement, in seconds.
+    delay: float
+        The time to wait before starting, in seconds.
+    easing: function
+        Maps the fraction of the duration that passed to the fraction of the way covered.
+    elapsed: float
+        The time since the tween was added, in seconds.
+    on_done: function
+        Called without arguments once the target arrived, or None.
+
+    Methods
+    -------
+    advance:
+        Moves the target on by a time step and returns whether it arrived.
+    """
+    __slots__ = ("target", "start", "end", "duration", "delay", "easing", "elapsed", "on_done")
+
+    def __init__(self, target, end, duration, easing=ease_out_cubic, delay=0.0, on_done=None):
+        self.target = target
+        self.start = target.position
+        self.end = end
+        self.duration = duration
+        self.delay = delay
+        self.easing = easing
+        self.elapsed = 0.0
+        self.on_done = on_done
+
+    def advance(self, dt):
+        self.elapsed += dt
+        t = (self.elapsed - self.delay)/self.duration if self.duration > 0 else 1.0
+        if t >= 1:
+            self.target.position = self.end
+            return True
+        if t > 0:
+            self.target.position = self.start + (self.end - self.start)*self.easing(t)
+        return False
+
+
+class Scheduler:
+    """
+    A class to represent every running tween, advanced together once per frame.
+
+    Attributes
+    ----------
+    tweens: dict
+        Maps each animated object to its Tween.
+    time_scale: float
+        Multiplies every frame time; INSTANT finishes tweens as soon as they are added.
+    completed: int
+        The number of tweens that ran to the end.
+
+    Methods
+    -------
+    move:
+        Starts moving an object to a position, replacing any tween it already had.
+    update:
+        Advances every tween by a frame time and calls on_done for those that finished.
+    finish:
+        Puts every object at its destination now.
+    cancel:
+        Stops an object's tween where it is, without calling on_done.
+    """
+    def __init__(self, time_scale=1.0):
+        self.tweens = {}
+        self.time_scale = time_scale
+        self.completed = 0
+
+    @property
+    def busy(self):
+        return bool(self.tweens)
+
+    def move(self, target, end, duration, easing=ease_out_cubic, delay=0.0, on_done=None):
+        tween = Tween(target, end, duration, easing, delay, on_done)
+        self.tweens[target] = tween
+        if self.time_scale == INSTANT:
+            self.finish()
+        return tween
+
+    def update(self, dt):
+        if not self.tweens:
+            return
+        if self.time_scale == INSTANT:
+            self.finish()
+            return
+        dt *= self.time_scale
+        # on_done may start new tweens, so walk a copy
+        for target, tween in list(self.tweens.items()):
+            if tween.advance(dt):
+                self.done(target, tween)
+
+    def finish(self):
+        while self.tweens:
+            for target, tween in list(self.tweens.items()):
+                tween.advance(math.inf)
+                self.done(target, tween)
+
+    def done(self, target, tween):
+        if self.tweens.get(target) is tween:
+            del self.tweens[target]
+        self.completed += 1
+        if tween.on_done is not None:
+            tween.on_done()
+
+    def cancel(self, target):
+        self.tweens.pop(target, None)
+
+    def __len__(self):
+        return len(self.tweens)
+
+
+animations = Scheduler(parse_time_scale(os.environ.get("UNO_TIME_SCALE")))